@@ -76,6 +76,13 @@ class TransactionResponse(BaseModel):
     message: str
 
 
+class BatchTransactionResponse(BaseModel):
+    """Respuesta al crear varias transacciones"""
+    ids: List[str]
+    success: bool
+    message: str
+
+
 class QueryRequest(BaseModel):
     """Request para ejecutar una query SQL"""
     sql: str = Field(..., description="Query SQL a ejecutar (solo SELECT)")
@@ -182,6 +189,40 @@ def generate_id() -> str:
     return str(uuid4())
 
 
+def insert_transaction(conn, transaction: TransactionCreate) -> str:
+    """Insertar una transacción (sin commit) y devolver su ID"""
+    # Generar ID
+    transaction_id = generate_id()
+    
+    # Usar fecha actual si no se provee
+    date = transaction.date if transaction.date else datetime.now().isoformat()
+    
+    conn.execute("""
+        INSERT INTO transactions (
+            id, date, amount, currency, expense_type, category,
+            is_income, payment_method, money_source, description,
+            notes, exchange_rate, converted_amount, converted_currency
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        transaction_id,
+        date,
+        transaction.amount,
+        transaction.currency,
+        transaction.expense_type,
+        transaction.category,
+        1 if transaction.is_income else 0,
+        transaction.payment_method,
+        transaction.money_source,
+        transaction.description,
+        transaction.notes,
+        transaction.exchange_rate,
+        transaction.converted_amount,
+        transaction.converted_currency
+    ))
+    
+    return transaction_id
+
+
 # ============================================================================
 # Autenticación
 # ============================================================================
@@ -248,36 +289,9 @@ async def ingest_transaction(
     Requiere header: X-API-Key
     """
     try:
-        # Generar ID
-        transaction_id = generate_id()
-        
-        # Usar fecha actual si no se provee
-        date = transaction.date if transaction.date else datetime.now().isoformat()
-        
         # Insertar en la base de datos
         with get_db_connection() as conn:
-            conn.execute("""
-                INSERT INTO transactions (
-                    id, date, amount, currency, expense_type, category,
-                    is_income, payment_method, money_source, description,
-                    notes, exchange_rate, converted_amount, converted_currency
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                transaction_id,
-                date,
-                transaction.amount,
-                transaction.currency,
-                transaction.expense_type,
-                transaction.category,
-                1 if transaction.is_income else 0,
-                transaction.payment_method,
-                transaction.money_source,
-                transaction.description,
-                transaction.notes,
-                transaction.exchange_rate,
-                transaction.converted_amount,
-                transaction.converted_currency
-            ))
+            transaction_id = insert_transaction(conn, transaction)
             conn.commit()
         
         return TransactionResponse(
@@ -290,6 +304,37 @@ async def ingest_transaction(
         raise HTTPException(status_code=500, detail=f"Error al insertar transacción: {str(e)}")
 
 
+@web_app.post("/ingest_batch", response_model=BatchTransactionResponse)
+async def ingest_transactions_batch(
+    transactions: List[TransactionCreate],
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Insertar varias transacciones en una sola request
+    
+    Todo o nada: se insertan en una única transacción SQLite.
+    Los IDs se devuelven en el mismo orden que el body.
+    
+    Requiere header: X-API-Key
+    """
+    if not transactions:
+        raise HTTPException(status_code=400, detail="Lista de transacciones vacía")
+    
+    try:
+        with get_db_connection() as conn:
+            ids = [insert_transaction(conn, t) for t in transactions]
+            conn.commit()
+        
+        return BatchTransactionResponse(
+            ids=ids,
+            success=True,
+            message=f"{len(ids)} transacción(es) creada(s) exitosamente"
+        )
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al insertar transacciones: {str(e)}")
+
+
 @web_app.post("/query", response_model=QueryResponse)
 async def execute_query(
     query: QueryRequest,
@@ -8,21 +8,26 @@ import os
 import json
 import yaml
 import argparse
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, NamedTuple
 import requests
 from decimal import Decimal
+from dotenv import load_dotenv
+
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+
+# (connect, read) en segundos para todas las requests a Modal: el bot corre
+# estas funciones en un thread, y asyncio.wait_for no puede cortar un thread
+HTTP_TIMEOUT = (5, 20)
 
 
 def load_env():
     """Cargar variables de entorno desde .env si existe"""
     env_path = os.path.join(os.path.dirname(__file__), '.env')
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ.setdefault(key.strip(), value.strip())
+    load_dotenv(env_path, override=False)
 
 
 def convert_yaml_to_json(yaml_string: str) -> Dict[str, Any]:
@@ -46,7 +51,7 @@ def convert_yaml_to_json(yaml_string: str) -> Dict[str, Any]:
     """
     try:
         # Parsear YAML
-        data = yaml.safe_load(yaml_string)
+        data = yaml.load(yaml_string, Loader=_YamlLoader)
         
         if not data:
             raise ValueError("YAML vacío")
@@ -150,7 +155,47 @@ def send_to_modal(json_data: Dict[str, Any], api_url: Optional[str] = None, api_
     
     try:
         # Hacer request
-        response = requests.post(ingest_url, json=json_data, headers=headers)
+        response = requests.post(ingest_url, json=json_data, headers=headers, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        
+        return response.json()
+    
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"Error al enviar a Modal API: {e}")
+
+
+def send_batch_to_modal(json_items: List[Dict[str, Any]], api_url: Optional[str] = None, api_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Envía varias transacciones a Modal API en una sola request (/ingest_batch)
+    
+    Args:
+        json_items: Transacciones en formato JSON
+        api_url: URL de la API (default: desde env MODAL_API_URL)
+        api_key: API key (default: desde env FINANZAS_API_KEY)
+    
+    Returns:
+        Respuesta de la API, con los IDs en el mismo orden que json_items
+    """
+    # Cargar configuración
+    if api_url is None:
+        api_url = os.environ.get('MODAL_API_URL')
+        if not api_url:
+            raise ValueError("MODAL_API_URL no configurada. Set en .env o pasa como argumento")
+    
+    if api_key is None:
+        api_key = os.environ.get('FINANZAS_API_KEY')
+        if not api_key:
+            raise ValueError("FINANZAS_API_KEY no configurada. Set en .env o pasa como argumento")
+    
+    batch_url = api_url.rstrip('/') + '/ingest_batch'
+    
+    headers = {
+        'X-API-Key': api_key,
+        'Content-Type': 'application/json'
+    }
+    
+    try:
+        response = requests.post(batch_url, json=json_items, headers=headers, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         
         return response.json()
@@ -193,7 +238,7 @@ def delete_transaction(transaction_id: str, api_url: Optional[str] = None, api_k
         if verbose:
             print(f"🗑️  Eliminando transacción {transaction_id}...")
         
-        response = requests.delete(delete_url, headers=headers)
+        response = requests.delete(delete_url, headers=headers, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         
         result = response.json()
@@ -240,7 +285,7 @@ def delete_all_transactions(api_url: Optional[str] = None, api_key: Optional[str
         if verbose:
             print("⚠️  Eliminando TODAS las transacciones...")
         
-        response = requests.delete(delete_url, headers=headers)
+        response = requests.delete(delete_url, headers=headers, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         
         result = response.json()
@@ -296,6 +341,86 @@ def ingest_from_yaml(yaml_string: str, api_url: Optional[str] = None, api_key: O
         raise
 
 
+class IngestResult(NamedTuple):
+    """Resultado de ingest(): equivalente a exit code 0, stdout y stderr del CLI"""
+    ok: bool
+    stdout: str
+    stderr: str
+
+
+def ingest(yaml_doc: str = '', delete_all: bool = False, verbose: bool = False,
+           api_url: Optional[str] = None, api_key: Optional[str] = None) -> IngestResult:
+    """
+    Equivalente in-process a `yaml_to_modal.py --yaml <doc>` (o a
+    `--delete-all` ya confirmado), para usar como librería sin lanzar
+    un subproceso por transacción
+    
+    Args:
+        yaml_doc: String en formato YAML (ignorado si delete_all)
+        delete_all: Eliminar TODAS las transacciones en lugar de ingestar
+        verbose: Mostrar información detallada
+        api_url: URL de la API
+        api_key: API key
+    
+    Returns:
+        IngestResult; nunca lanza, los errores quedan en stderr
+    """
+    try:
+        if delete_all:
+            result = delete_all_transactions(api_url=api_url, api_key=api_key, verbose=verbose)
+        else:
+            result = ingest_from_yaml(yaml_doc, api_url=api_url, api_key=api_key, verbose=verbose)
+    except Exception as e:
+        return IngestResult(False, '', str(e))
+    
+    return IngestResult(True, json.dumps(result, indent=2), '')
+
+
+def ingest_batch(yaml_docs: List[str], api_url: Optional[str] = None, api_key: Optional[str] = None) -> list:
+    """
+    Ingestar varios documentos YAML (uno por transacción) con una sola
+    llamada a /ingest_batch
+    
+    Los documentos que no convierten fallan individualmente; el resto se
+    envía junto y, como el endpoint es todo o nada, comparte el resultado.
+    
+    Args:
+        yaml_docs: Lista de strings YAML, una transacción cada uno
+        api_url: URL de la API
+        api_key: API key
+    
+    Returns:
+        Lista con un resultado por documento, en el mismo orden y con el
+        formato de ingest_batch_from_yaml(); nunca lanza. Los exitosos
+        incluyen en 'data' la transacción tal como se mandó a la API.
+    """
+    results = [None] * len(yaml_docs)
+    pending = []
+    payload = []
+    
+    for i, yaml_doc in enumerate(yaml_docs):
+        try:
+            payload.append(convert_yaml_to_json(yaml_doc))
+            pending.append(i)
+        except Exception as e:
+            results[i] = {'success': False, 'index': i + 1, 'error': str(e)}
+    
+    if payload:
+        try:
+            response = send_batch_to_modal(payload, api_url, api_key)
+            ids = response.get('ids') or []
+            if len(ids) != len(payload):
+                raise RuntimeError(f"La API devolvió {len(ids)} IDs para {len(payload)} transacciones")
+            
+            for i, json_data, transaction_id in zip(pending, payload, ids):
+                results[i] = {'success': True, 'index': i + 1, 'result': {'id': transaction_id}, 'data': json_data}
+        except Exception as e:
+            for i in pending:
+                results[i] = {'success': False, 'index': i + 1, 'error': str(e)}
+    
+    return results
+
+
 def ingest_batch_from_yaml(yaml_string: str, api_url: Optional[str] = None, api_key: Optional[str] = None, verbose: bool = False) -> list:
     """
     Procesar múltiples transacciones desde un YAML
@@ -313,7 +438,7 @@ def ingest_batch_from_yaml(yaml_string: str, api_url: Optional[str] = None, api_
            descripcion: Café
     """
     try:
-        data = yaml.safe_load(yaml_string)
+        data = yaml.load(yaml_string, Loader=_YamlLoader)
         
         if not data:
             raise ValueError("YAML vacío")
@@ -14,17 +14,11 @@ from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 import uvicorn
 from openai import OpenAI
+from dotenv import load_dotenv
 
-# Cargar variables de entorno
+# Cargar variables de entorno (las ya exportadas tienen prioridad)
 def load_env():
-    env_path = '.env'
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ.setdefault(key.strip(), value.strip())
+    load_dotenv('.env', override=False)
 
 load_env()
 
@@ -7,23 +7,73 @@ import os
 import csv
 import sys
 import json
+import asyncio
 import sqlite3
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any, List
-import requests
+import httpx
+from dotenv import load_dotenv
+
+try:
+    # Opcional: apsw expone sqlite3_prepare/bind directamente (menos overhead por INSERT)
+    import apsw
+except ImportError:
+    apsw = None
+
+
+_INSERT_SQL = """
+    INSERT INTO transactions (
+        id, date, amount, currency, expense_type, category,
+        is_income, payment_method, money_source, description,
+        notes, exchange_rate, converted_amount, converted_currency
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+# Mapeo CSV (español) → SQL (inglés), construido una sola vez
+_STR_FIELDS = (
+    ('id', 'id'),
+    ('fecha', 'date'),
+    ('moneda', 'currency'),
+    ('tipo_gasto', 'expense_type'),
+    ('metodo_pago', 'payment_method'),
+    ('fuente_dinero', 'money_source'),
+    ('descripcion', 'description'),
+    ('categoria', 'category'),
+    ('notas', 'notes'),
+    ('moneda_convertida', 'converted_currency'),
+)
+_FLOAT_FIELDS = (
+    ('monto', 'amount'),
+    ('tasa_cambio', 'exchange_rate'),
+    ('monto_convertido', 'converted_amount'),
+)
+_TRUE = frozenset({'true', '1', 'yes'})
 
 
 def load_env():
     """Cargar variables de entorno desde .env si existe"""
-    env_path = os.path.join(os.path.dirname(__file__), '.env')
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ.setdefault(key.strip(), value.strip())
+    load_dotenv(os.path.join(os.path.dirname(__file__), '.env'), override=False)
+
+
+def _connect_sqlite(db_path: str):
+    """
+    Abrir conexión SQLite en modo autocommit (BEGIN/COMMIT explícitos)
+
+    Usa apsw si está instalado, sino sqlite3 de la stdlib
+    """
+    if apsw is not None:
+        return apsw.Connection(db_path)
+    return sqlite3.connect(db_path, isolation_level=None)
+
+
+def _executescript(conn, script: str):
+    """Ejecutar múltiples sentencias SQL con cualquiera de los dos drivers"""
+    if apsw is not None:
+        conn.cursor().execute(script)
+    else:
+        conn.executescript(script)
 
 
 def read_csv_transactions(csv_path: str) -> List[Dict[str, Any]]:
@@ -67,42 +117,21 @@ def convert_csv_to_sql_format(csv_row: Dict[str, Any]) -> Dict[str, Any]:
     - monto_convertido → converted_amount
     - moneda_convertida → converted_currency
     """
-    sql_row = {}
-    
-    # Mapeo directo
-    mapping = {
-        'id': 'id',
-        'fecha': 'date',
-        'monto': 'amount',
-        'moneda': 'currency',
-        'tipo_gasto': 'expense_type',
-        'metodo_pago': 'payment_method',
-        'fuente_dinero': 'money_source',
-        'descripcion': 'description',
-        'categoria': 'category',
-        'notas': 'notes',
-        'es_ingreso': 'is_income',
-        'tasa_cambio': 'exchange_rate',
-        'monto_convertido': 'converted_amount',
-        'moneda_convertida': 'converted_currency'
-    }
+    # Strings: solo los campos con valor (vacíos se omiten)
+    sql_row = {sql_key: csv_row[csv_key] for csv_key, sql_key in _STR_FIELDS if csv_row.get(csv_key)}
     
-    for csv_key, sql_key in mapping.items():
-        if csv_key in csv_row and csv_row[csv_key]:
-            value = csv_row[csv_key]
-            
-            # Convertir tipos
-            if sql_key in ['amount', 'exchange_rate', 'converted_amount']:
-                try:
-                    sql_row[sql_key] = float(value)
-                except (ValueError, TypeError):
-                    sql_row[sql_key] = None
-            elif sql_key == 'is_income':
-                # Convertir string 'True'/'False' a booleano
-                sql_row[sql_key] = value.lower() in ['true', '1', 'yes']
-            else:
-                # String, mantener como está (pero convertir vacíos a None)
-                sql_row[sql_key] = value if value else None
+    for csv_key, sql_key in _FLOAT_FIELDS:
+        value = csv_row.get(csv_key)
+        if value:
+            try:
+                sql_row[sql_key] = float(value)
+            except (ValueError, TypeError):
+                sql_row[sql_key] = None
+    
+    # Convertir string 'True'/'False' a booleano
+    es_ingreso = csv_row.get('es_ingreso')
+    if es_ingreso:
+        sql_row['is_income'] = es_ingreso.lower() in _TRUE
     
     # Validaciones
     if 'amount' not in sql_row or not sql_row['amount']:
@@ -142,7 +171,7 @@ def create_local_sqlite_from_csv(csv_path: str, db_path: str, schema_path: str)
     os.makedirs(os.path.dirname(db_path) if os.path.dirname(db_path) else '.', exist_ok=True)
     
     # Crear base de datos
-    conn = sqlite3.connect(db_path)
+    conn = _connect_sqlite(db_path)
     
     try:
         # Ejecutar schema
@@ -150,11 +179,11 @@ def create_local_sqlite_from_csv(csv_path: str, db_path: str, schema_path: str)
             print(f"   Ejecutando schema desde {schema_path}...")
             with open(schema_path, 'r') as f:
                 schema = f.read()
-                conn.executescript(schema)
+                _executescript(conn, schema)
         else:
             print(f"   ⚠️  Schema no encontrado en {schema_path}, usando schema básico...")
             # Schema mínimo
-            conn.executescript("""
+            _executescript(conn, """
                 CREATE TABLE IF NOT EXISTS transactions (
                     id TEXT PRIMARY KEY,
                     date TEXT NOT NULL,
@@ -174,22 +203,19 @@ def create_local_sqlite_from_csv(csv_path: str, db_path: str, schema_path: str)
                 );
             """)
         
-        # Insertar transacciones
+        # Insertar transacciones (una sola transacción, mismo statement preparado)
         inserted = 0
         errors = 0
         
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        
         for i, csv_row in enumerate(csv_transactions, 1):
             try:
                 sql_row = convert_csv_to_sql_format(csv_row)
                 
                 # Insertar
-                conn.execute("""
-                    INSERT INTO transactions (
-                        id, date, amount, currency, expense_type, category,
-                        is_income, payment_method, money_source, description,
-                        notes, exchange_rate, converted_amount, converted_currency
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+                cursor.execute(_INSERT_SQL, (
                     sql_row.get('id'),
                     sql_row.get('date'),
                     sql_row.get('amount'),
@@ -212,7 +238,7 @@ def create_local_sqlite_from_csv(csv_path: str, db_path: str, schema_path: str)
                 print(f"   ⚠️  Error en fila {i}: {e}")
                 errors += 1
         
-        conn.commit()
+        cursor.execute("COMMIT")
         
         print(f"   ✅ Insertadas {inserted} transacciones")
         if errors > 0:
@@ -224,10 +250,14 @@ def create_local_sqlite_from_csv(csv_path: str, db_path: str, schema_path: str)
         conn.close()
 
 
-def upload_to_modal(db_path: str, api_url: str, api_key: str, batch_size: int = 10) -> Dict[str, int]:
+async def upload_to_modal(db_path: str, api_url: str, api_key: str, batch_size: int = 10,
+                          max_concurrency: int = 64) -> Dict[str, int]:
     """
     Subir transacciones de SQLite local a Modal API
     
+    Los POST se hacen concurrentemente sobre una única conexión HTTP/2
+    (httpx multiplexa los streams), limitados por max_concurrency.
+    
     Returns:
         Dict con estadísticas: {success: int, errors: int}
     """
@@ -250,25 +280,36 @@ def upload_to_modal(db_path: str, api_url: str, api_key: str, batch_size: int =
         """)
         
         transactions = cursor.fetchall()
-        total = len(transactions)
-        
-        print(f"   Total a subir: {total}")
-        
-        # Subir en batches
-        success = 0
-        errors = 0
-        
-        ingest_url = api_url.rstrip('/') + '/ingest'
-        headers = {
-            'X-API-Key': api_key,
-            'Content-Type': 'application/json'
-        }
+    
+    finally:
+        conn.close()
+    
+    total = len(transactions)
+    
+    print(f"   Total a subir: {total}")
+    
+    success = 0
+    errors = 0
+    done = 0
+    
+    ingest_url = api_url.rstrip('/') + '/ingest'
+    headers = {
+        'X-API-Key': api_key,
+        'Content-Type': 'application/json'
+    }
+    
+    semaphore = asyncio.Semaphore(max_concurrency)
+    limits = httpx.Limits(max_connections=8, max_keepalive_connections=8)
+    
+    async with httpx.AsyncClient(http2=True, headers=headers, limits=limits, timeout=30.0) as client:
         
-        for i, row in enumerate(transactions, 1):
+        async def _upload_one(row: sqlite3.Row):
+            nonlocal success, errors, done
+            
             try:
-                # Convertir a dict
+                # Convertir a dict (las columnas REAL ya vienen como float de SQLite)
                 data = {
-                    'amount': float(row['amount']),
+                    'amount': row['amount'],
                     'currency': row['currency'] or 'ARS',
                     'expense_type': row['expense_type'],
                     'category': row['category'],
@@ -282,32 +323,33 @@ def upload_to_modal(db_path: str, api_url: str, api_key: str, batch_size: int =
                 
                 # Agregar campos opcionales solo si existen
                 if row['exchange_rate']:
-                    data['exchange_rate'] = float(row['exchange_rate'])
+                    data['exchange_rate'] = row['exchange_rate']
                 if row['converted_amount']:
-                    data['converted_amount'] = float(row['converted_amount'])
+                    data['converted_amount'] = row['converted_amount']
                 if row['converted_currency']:
                     data['converted_currency'] = row['converted_currency']
                 
                 # POST a la API
-                response = requests.post(ingest_url, json=data, headers=headers)
+                async with semaphore:
+                    response = await client.post(ingest_url, json=data)
                 response.raise_for_status()
                 
                 success += 1
-                
-                # Mostrar progreso cada 10 transacciones
-                if i % 10 == 0 or i == total:
-                    print(f"   Progreso: {i}/{total} ({success} exitosas, {errors} errores)")
             
             except Exception as e:
                 print(f"   ⚠️  Error en transacción {row['id']}: {e}")
                 errors += 1
+            
+            # Mostrar progreso cada 10 transacciones
+            done += 1
+            if done % 10 == 0 or done == total:
+                print(f"   Progreso: {done}/{total} ({success} exitosas, {errors} errores)")
         
-        print(f"\n   ✅ Completado: {success} exitosas, {errors} errores")
-        
-        return {'success': success, 'errors': errors}
+        await asyncio.gather(*(_upload_one(row) for row in transactions))
     
-    finally:
-        conn.close()
+    print(f"\n   ✅ Completado: {success} exitosas, {errors} errores")
+    
+    return {'success': success, 'errors': errors}
 
 
 def main():
@@ -386,7 +428,7 @@ Variables de entorno:
             print("   Set en .env o usa --api-key")
             sys.exit(1)
         
-        stats = upload_to_modal(args.db, api_url, api_key)
+        stats = asyncio.run(upload_to_modal(args.db, api_url, api_key))
         
         print("\n" + "="*70)
         print("RESUMEN DE MIGRACIÓN")
@@ -4,22 +4,20 @@ Script para generar SQL desde lenguaje natural usando Llama local
 y ejecutar queries en la API de Modal
 """
 import os
+import re
 import sys
 import json
+import functools
 import requests
+import sqlglot
+from sqlglot import exp
 from typing import Optional, Dict, Any
+from dotenv import load_dotenv
 
 
 def load_env():
     """Cargar variables de entorno desde .env si existe"""
-    env_path = os.path.join(os.path.dirname(__file__), '.env')
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ.setdefault(key.strip(), value.strip())
+    load_dotenv(os.path.join(os.path.dirname(__file__), '.env'), override=False)
 
 
 # Sistema prompt optimizado para modelos pequeños
@@ -47,6 +45,15 @@ COMMON QUERIES:
 Output ONLY the SQL, nothing else."""
 
 
+# Nodos del AST que modifican la base (REPLACE INTO parsea como Insert;
+# Command cubre sentencias que sqlglot no modela)
+_UNSAFE_NODES = (
+    exp.Delete, exp.Update, exp.Insert, exp.Drop, exp.Alter, exp.Create,
+    exp.TruncateTable, exp.Pragma, exp.Attach, exp.Detach, exp.Command
+)
+_STARTS_SELECT = re.compile(r'\s*SELECT\b', re.IGNORECASE)
+
+
 def generate_sql_with_llama(question: str, model: str = "llama3.2") -> str:
     """
     Generar SQL usando Llama local via Ollama
@@ -98,6 +105,7 @@ def generate_sql_with_llama(question: str, model: str = "llama3.2") -> str:
         sys.exit(1)
 
 
+@functools.lru_cache(maxsize=512)
 def is_safe_query(sql: str) -> bool:
     """
     Validar que el query sea seguro (solo SELECT)
@@ -108,23 +116,20 @@ def is_safe_query(sql: str) -> bool:
     Returns:
         True si es seguro, False si es peligroso
     """
-    dangerous_keywords = [
-        'DELETE', 'UPDATE', 'INSERT', 'DROP', 'ALTER',
-        'CREATE', 'TRUNCATE', 'REPLACE', 'PRAGMA', 'ATTACH', 'DETACH'
-    ]
-    
-    sql_upper = sql.upper().strip()
-    
-    # Debe empezar con SELECT
-    if not sql_upper.startswith('SELECT'):
+    # Debe empezar con SELECT (la API aplica la misma regla)
+    if not _STARTS_SELECT.match(sql):
         return False
     
-    # No debe contener keywords peligrosos
-    for keyword in dangerous_keywords:
-        if keyword in sql_upper:
-            return False
+    # Parsear una sola vez: los keywords dentro de strings no son falsos positivos
+    try:
+        tree = sqlglot.parse_one(sql, read='sqlite')
+    except sqlglot.errors.ParseError:
+        return False
     
-    return True
+    # Una sola consulta (varias sentencias parsean como Block) y sin nodos peligrosos
+    if not isinstance(tree, exp.Query):
+        return False
+    return not any(isinstance(node, _UNSAFE_NODES) for node in tree.walk())
 
 
 def execute_query(sql: str, api_url: Optional[str] = None, api_key: Optional[str] = None) -> Dict[str, Any]:
@@ -3,30 +3,46 @@
 Bot de Telegram para finanzas con LLM
 Usa LLM en Modal para convertir texto natural a YAML
 """
+import io
 import os
+import re
 import sys
-import subprocess
-import json
-import requests
+import time
+import random
+import logging
+import asyncio
+import functools
+import weakref
+import collections
+import concurrent.futures
+import httpx
+import orjson
+from dotenv import load_dotenv
 from telegram import Update
+from telegram.error import BadRequest
+from telegram.helpers import escape_markdown
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from openai import OpenAI
+from telegram.request import HTTPXRequest
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# El bot se corre como `python telegram/bot.py`: agregar la raíz del repo
+# al final del path para importar cli/ sin tapar el paquete `telegram`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cli.yaml_to_modal import HTTP_TIMEOUT, ingest as _ingest, ingest_batch as _ingest_batch
 
 # Cargar variables de entorno
 def load_env():
-    env_path = '.env'
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ.setdefault(key.strip(), value.strip())
+    load_dotenv('.env', override=False)
 
 load_env()
 
 TELEGRAM_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
+WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL')
+WEBHOOK_PORT = int(os.environ.get('TELEGRAM_WEBHOOK_PORT', '8443'))
 LLM_API_URL = os.environ.get('LLM_API_URL', '')
+MODAL_API_URL = os.environ.get('MODAL_API_URL', '')
 FINANZAS_API_KEY = os.environ.get('FINANZAS_API_KEY', '')
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
 
@@ -44,44 +60,491 @@ if not OPENAI_API_KEY:
     print("   Agrega tu OpenAI API key para usar Whisper")
 
 # Inicializar cliente OpenAI para Whisper
-openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+
+# Textos estáticos de respuesta (se arman una sola vez al importar)
+_HELP_TEMPLATE = (
+    "💰 *Bot de Finanzas Personales*\n\n"
+    "Comandos disponibles:\n\n"
+    "🤖 Modo inteligente (con LLM):\n"
+    "   Simplemente escribe en lenguaje natural:\n"
+    "   • \"Gasté 5000 en café\"\n"
+    "   • \"Pagué 45000 de alquiler\"\n"
+    "   • \"Me llegó el sueldo de 200000\"\n\n"
+    "🎤 Mensajes de voz:\n"
+    "   ¡Ahora puedes enviar audios!\n"
+    "   El bot transcribe y procesa automáticamente\n"
+    "   Perfecto para usar con Action Button del iPhone\n\n"
+    "📝 Comandos manuales:\n"
+    "   `/gastar <monto> <descripcion>` - Registrar gasto\n"
+    "   `/ingreso <monto> <descripcion>` - Registrar ingreso\n\n"
+    "📊 Consultas:\n"
+    "   `/balance` - Ver balance actual\n"
+    "   `/stats` - Ver estadísticas completas\n\n"
+    "🗑️ Otros:\n"
+    "   `/limpiar` - Borrar todas las transacciones\n"
+    "   `/help` - Ver esta ayuda\n\n"
+    "🧠 LLM: {llm_status}\n"
+    "🎤 Audio: {voice_status}\n\n"
+    "🆔 Tu Chat ID: `{chat_id}`\n"
+    "_(Úsalo en Shortcuts de iOS)_"
+)
+
+# El estado del LLM y de Whisper no cambia en runtime: solo queda el hueco de chat_id
+_HELP_TEXT = _HELP_TEMPLATE.format(
+    llm_status="✅ Conectado" if LLM_API_URL else "❌ Sin configurar",
+    voice_status="✅ Whisper habilitado" if openai_client else "❌ Sin configurar",
+    chat_id="{chat_id}"
+)
+
+_USAGE_GASTAR = (
+    "❌ Uso: `/gastar <monto> [descripcion]`\n"
+    "Ejemplo: `/gastar 5000 Café`"
+)
+
+_USAGE_INGRESO = (
+    "❌ Uso: `/ingreso <monto> [descripcion]`\n"
+    "Ejemplo: `/ingreso 50000 Sueldo`"
+)
+
+# Separador entre documentos cuando el LLM detecta varias transacciones
+_DOC_SEP = re.compile(r'\n---\n')
+# Margen bajo el límite de 4096 caracteres por mensaje de Telegram
+_MAX_MESSAGE = 4000
+
+# Cliente HTTP compartido: keep-alive para no pagar TCP+TLS en cada llamada al LLM
+_http = httpx.AsyncClient(
+    timeout=30.0,
+    limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60)
+)
+
+# Pool para IO bloqueante (HTTP síncrono de cli/); los workers
+# esperan red, así que el GIL no es un cuello de botella
+_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="bot-io")
+
+# Timeout visible para el usuario en las ingestas: nunca menor que el timeout
+# HTTP de cli/, así el POST ya terminó (o falló) cuando avisamos del timeout
+_INGEST_TIMEOUT = sum(HTTP_TIMEOUT) + 5
+
+# Máximo de ingestas simultáneas hacia Modal (compartido entre todos los chats)
+_ingest_semaphore = asyncio.Semaphore(8)
+
+# Máximo de transcripciones simultáneas hacia Whisper (rate limits de OpenAI)
+_whisper_semaphore = asyncio.Semaphore(5)
+
+# Máximo de llamadas simultáneas al LLM service
+_llm_semaphore = asyncio.Semaphore(10)
+
+# Mensajes en vuelo por chat: una ráfaga de un usuario no acapara los
+# semáforos globales. Débil: el semáforo vive mientras alguien lo use
+_CHAT_CONCURRENCY = 2
+_chat_semaphores = weakref.WeakValueDictionary()
+
+# Cache de /stats para absorber ráfagas de /balance y /stats; "gen" cuenta
+# las invalidaciones para no guardar totales pedidos antes de una escritura
+_STATS_TTL = 5.0
+_stats_cache = {"t": 0.0, "data": None, "gen": 0}
+_stats_lock = asyncio.Lock()
+
+# Chats cuyo chat_id ya se logueó en /start (uno por chat y por proceso)
+_logged_chats = set()
+
+# Cache de respuestas del LLM por texto normalizado ("café 5000" se repite a diario)
+_LLM_CACHE_SIZE = 1000
+_llm_cache = collections.OrderedDict()
+
+
+async def run_cmd(argv, stdin=None, timeout=30):
+    """
+    Ejecutar un comando sin bloquear el event loop
+    
+    Args:
+        argv: Comando y argumentos
+        stdin: Bytes a enviar por stdin (opcional)
+        timeout: Segundos antes de matar el proceso (lanza asyncio.TimeoutError)
+    
+    Returns:
+        (returncode, stdout, stderr) con stdout/stderr en bytes
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *argv,
+        stdin=asyncio.subprocess.PIPE if stdin is not None else None,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(stdin), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    
+    return proc.returncode, stdout, stderr
 
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Comando /start"""
-    llm_status = "✅ Conectado" if LLM_API_URL else "❌ Sin configurar"
+async def run_blocking(fn, *args, **kwargs):
+    """Correr una función bloqueante en _POOL sin frenar el event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_POOL, functools.partial(fn, *args, **kwargs))
+
+
+async def ingest_yaml(yaml_doc='', delete_all=False, timeout=None):
+    """
+    Ingestar YAML (o borrar todo) in-process, en _POOL para que el
+    HTTP bloqueante hacia Modal no frene el event loop
+    
+    Returns:
+        IngestResult (ok, stdout, stderr)
+    """
+    return await asyncio.wait_for(
+        run_blocking(_ingest, yaml_doc, delete_all),
+        timeout=timeout or _INGEST_TIMEOUT
+    )
+
+
+def _is_transient(e):
+    """Errores de red o 5xx que vale la pena reintentar (cold start de Modal, 502)"""
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, httpx.TransportError)
+
+
+async def _retry(coro_fn, *, attempts=3, base=0.5):
+    """
+    Ejecutar coro_fn() reintentando errores transitorios con backoff
+    exponencial y jitter
+    
+    Solo para llamadas idempotentes (LLM, /stats); la ingesta no se
+    reintenta para no duplicar transacciones.
+    """
+    for i in range(attempts):
+        try:
+            return await coro_fn()
+        except (httpx.HTTPStatusError, httpx.TransportError) as e:
+            if i == attempts - 1 or not _is_transient(e):
+                raise
+            await asyncio.sleep(base * 2 ** i + random.random() * 0.25)
+
+
+async def get_stats(timeout=30):
+    """
+    Estadísticas de la API, cacheadas por _STATS_TTL segundos
+    
+    El lock hace que pedidos concurrentes compartan una sola consulta.
+    Las escrituras del bot invalidan el cache con invalidate_stats(); si eso
+    pasa mientras la consulta está en vuelo, el resultado se devuelve pero
+    no se cachea.
+    """
+    async with _stats_lock:
+        now = time.monotonic()
+        if _stats_cache["data"] is not None and now - _stats_cache["t"] < _STATS_TTL:
+            return _stats_cache["data"]
+        
+        if not MODAL_API_URL:
+            raise RuntimeError("MODAL_API_URL no configurada")
+        
+        gen = _stats_cache["gen"]
+        
+        async def fetch():
+            response = await _http.get(
+                f"{MODAL_API_URL.rstrip('/')}/stats",
+                headers={'X-API-Key': FINANZAS_API_KEY},
+                timeout=timeout
+            )
+            response.raise_for_status()
+            return response
+        
+        response = await _retry(fetch)
+        data = orjson.loads(response.content)
+        if _stats_cache["gen"] == gen:
+            _stats_cache.update(t=now, data=data)
+        return data
+
+
+def invalidate_stats():
+    """Descartar el cache de /stats tras registrar o borrar transacciones"""
+    _stats_cache["data"] = None
+    _stats_cache["gen"] += 1
+
+
+async def fetch_llm(text, timeout=30):
+    """
+    Pedir al LLM service el YAML de un texto libre
+    
+    Consulta primero el cache que llena cache_llm_result(); un hit devuelve
+    el mismo YAML sin info de tokens. Errores de red y 5xx
+    se reintentan con backoff; cada intento tiene su propio `timeout`,
+    así que la llamada completa puede tardar hasta ~3×`timeout` más el
+    backoff.
+    
+    Returns:
+        Respuesta del servicio ya decodificada (dict)
+    
+    Raises:
+        TimeoutError si un intento supera `timeout` (no se reintenta),
+        httpx.HTTPStatusError si el servicio no responde 2xx
+    """
+    key = _llm_key(text)
+    
+    yaml_output = _llm_cache.get(key)
+    if yaml_output is not None:
+        _llm_cache.move_to_end(key)
+        return {"success": True, "yaml_output": yaml_output, "tokens": {}}
+    
+    async def post():
+        # El timeout corre desde que se obtiene el semáforo, no mientras se espera
+        async with _llm_semaphore:
+            async with asyncio.timeout(timeout):
+                async with _http.stream(
+                    "POST",
+                    LLM_API_URL,
+                    json={
+                        "text": text,
+                        "api_key": FINANZAS_API_KEY,
+                    }
+                ) as response:
+                    raw = await response.aread()
+                    response.raise_for_status()
+                    return raw
+    
+    return orjson.loads(await _retry(post))
+
+
+def _llm_key(text):
+    """Clave del cache del LLM: minúsculas y espacios colapsados; los montos quedan tal cual"""
+    return " ".join(text.lower().split())
+
+
+def cache_llm_result(text, yaml_output, ok):
+    """
+    Guardar (LRU) el YAML del LLM para `text` solo si se ingestó sin errores;
+    si no, descartarlo, así reenviar el mismo texto vuelve a consultar al LLM
+    """
+    key = _llm_key(text)
+    if not ok:
+        _llm_cache.pop(key, None)
+        return
+    
+    _llm_cache[key] = yaml_output
+    _llm_cache.move_to_end(key)
+    if len(_llm_cache) > _LLM_CACHE_SIZE:
+        _llm_cache.popitem(last=False)
+
+
+async def transcribe_audio(audio):
+    """Transcribir con Whisper un audio OGG ya descargado en memoria"""
+    audio_file = io.BytesIO(audio)
+    audio_file.name = "voice.ogg"  # OpenAI deduce el formato por la extensión
+    
+    async with _whisper_semaphore:
+        return await openai_client.audio.transcriptions.create(
+            model="whisper-1",
+            file=audio_file,
+            language="es"  # Español
+        )
+
+
+def iter_yaml_docs(blob):
+    """
+    Iterar los documentos YAML de la salida del LLM sin partirla de una vez
+    
+    Cada documento sale ya sin espacios alrededor; los vacíos se omiten.
+    """
+    last = 0
+    for m in _DOC_SEP.finditer(blob):
+        doc = blob[last:m.start()].strip()
+        if doc:
+            yield doc
+        last = m.end()
+    doc = blob[last:].strip()
+    if doc:
+        yield doc
+
+
+def limit_per_chat(handler):
+    """Limitar a _CHAT_CONCURRENCY los mensajes de un mismo chat procesándose a la vez"""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        sem = _chat_semaphores.get(chat_id)
+        if sem is None:
+            sem = _chat_semaphores[chat_id] = asyncio.Semaphore(_CHAT_CONCURRENCY)
+        
+        async with sem:
+            return await handler(update, context)
+    
+    return wrapper
+
+
+def send_placeholder(message, text):
+    """Mandar el aviso de "procesando" sin esperarlo, en paralelo con el trabajo"""
+    return asyncio.create_task(message.reply_text(text))
+
+
+async def send_with_fallback(send, text, **kwargs):
+    """
+    Mandar con send(text, **kwargs) y, si Telegram no puede parsear el
+    Markdown, reintentar como texto plano (la transacción ya puede estar
+    registrada: un "❌ Error" invitaría a reenviarla)
+    """
+    try:
+        return await send(text, **kwargs)
+    except BadRequest as e:
+        if 'parse_mode' not in kwargs or "can't parse entities" not in str(e).lower():
+            raise
+        logger.warning("Markdown rechazado por Telegram, reenviando sin formato: %s", e)
+        kwargs.pop('parse_mode')
+        return await send(text, **kwargs)
+
+
+async def edit_placeholder(message, placeholder, text, **kwargs):
+    """Reemplazar el aviso por la respuesta final (o responder si el aviso falló)"""
+    try:
+        sent = await placeholder
+    except Exception:
+        return await send_with_fallback(message.reply_text, text, **kwargs)
+    return await send_with_fallback(sent.edit_text, text, **kwargs)
+
+
+def _fmt_ars(v):
+    """Monto en pesos para mostrar: $12,345 (sin decimales)"""
+    return f"${v:,.0f}"
+
+
+def format_summary(titulo, successful, failed, tokens_info=None):
+    """Resumen de transacciones registradas y errores, para el mensaje final"""
+    parts = []
     
-    voice_status = "✅ Whisper habilitado" if openai_client else "❌ Sin configurar"
+    if successful:
+        parts.append(titulo.format(n=len(successful)))
+        
+        total_gastos = 0.0
+        total_ingresos = 0.0
+        
+        for tx in successful:
+            monto = tx['monto']
+            categoria = tx['categoria']
+            
+            if tx['es_ingreso']:
+                total_ingresos += monto
+                emoji = "💵"
+            else:
+                total_gastos += monto
+                emoji = "💸"
+            
+            # Texto del usuario/LLM: escapar para no romper el Markdown
+            cat_text = f" ({escape_markdown(str(categoria))})" if categoria else ""
+            parts.append(f"{emoji} {_fmt_ars(monto)} - {escape_markdown(str(tx['descripcion']))}{cat_text}\n")
+        
+        # Calcular balance neto de estas transacciones
+        balance_neto = total_ingresos - total_gastos
+        balance_emoji = "📈" if balance_neto > 0 else "📉" if balance_neto < 0 else "➖"
+        signo = "+" if balance_neto > 0 else ""
+        parts.append(f"\n{balance_emoji} *Balance neto: {signo}{_fmt_ars(balance_neto)}*")
+        
+        # Agregar info de tokens si está disponible
+        if tokens_info and tokens_info.get('total_tokens'):
+            parts.append(f"\n\n🔢 Tokens: {tokens_info['total_tokens']}")
+    
+    if failed:
+        if parts:
+            parts.append("\n\n")
+        parts.append("⚠️ *Errores:*\n\n")
+        parts.append("\n".join(escape_markdown(error) for error in failed))
+    
+    return "".join(parts)
+
+
+async def reply_llm_result(message, placeholder, prefix, yaml_output, yaml_docs, summary):
+    """
+    Reemplazar el aviso por un único mensaje con el YAML generado por el
+    LLM (para que el usuario lo valide) y el resumen
+    
+    Si no entra en un mensaje de Telegram, el aviso queda con el resumen y
+    el YAML va aparte.
+    """
+    head = f"{prefix}📝 *{len(yaml_docs)} transacción(es) detectada(s)*\n\n"
+    yaml_block = f"🔍 *YAML generado por el LLM:*\n```yaml\n{yaml_output}\n```"
+    
+    text = f"{head}{yaml_block}\n\n{summary}"
+    if len(text) <= _MAX_MESSAGE:
+        await edit_placeholder(message, placeholder, text, parse_mode='Markdown')
+        return
+    
+    await edit_placeholder(message, placeholder, head + summary, parse_mode='Markdown')
     
-    # Mostrar chat_id para configurar shortcuts
+    if len(yaml_block) <= _MAX_MESSAGE:
+        await send_with_fallback(message.reply_text, yaml_block, parse_mode='Markdown')
+        return
+    
+    # Dividir por transacciones si es muy largo, llenando cada mensaje
+    # ("```yaml" + cierre + separadores caben en el margen de 20)
+    chunks = [[]]
+    size = 0
+    for i, yaml_doc in enumerate(yaml_docs, 1):
+        doc = f"# Transacción {i}\n{yaml_doc}"
+        if chunks[-1] and size + len(doc) > _MAX_MESSAGE - 20:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(doc)
+        size += len(doc) + 5
+    
+    for chunk in chunks:
+        body = "\n---\n".join(chunk)
+        await send_with_fallback(message.reply_text, f"```yaml\n{body}\n```", parse_mode='Markdown')
+
+
+async def ingest_docs(yaml_docs, timeout=None):
+    """
+    Ingestar los documentos generados por el LLM con una sola llamada a
+    /ingest_batch
+    
+    Espera documentos ya limpios, como los de iter_yaml_docs(). La validación
+    la hace convert_yaml_to_json (cli/), y el resumen se arma con el mismo
+    dict que se mandó a la API.
+    
+    Returns:
+        (successful, failed): transacciones registradas y mensajes de error
+    """
+    successful = []
+    failed = []
+    
+    if not yaml_docs:
+        return successful, failed
+    
+    # Enviar a Modal API, todas juntas
+    async with _ingest_semaphore:
+        results = await asyncio.wait_for(
+            run_blocking(_ingest_batch, list(yaml_docs)),
+            timeout or _INGEST_TIMEOUT
+        )
+    
+    for result in results:
+        if result['success']:
+            data = result['data']
+            successful.append({
+                'monto': data['amount'],
+                'descripcion': data.get('description') or 'Sin descripción',
+                'es_ingreso': data['is_income'],
+                'categoria': data.get('category') or ''
+            })
+        else:
+            failed.append(f"Transacción {result['index']}: {result['error'][:100]}")
+    
+    return successful, failed
+
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Comando /start"""
+    # Mostrar chat_id para configurar shortcuts (solo la primera vez)
     chat_id = update.effective_chat.id
-    print(f"📱 Chat ID del usuario: {chat_id}")
+    if chat_id not in _logged_chats:
+        _logged_chats.add(chat_id)
+        logger.info("📱 Chat ID del usuario: %s", chat_id)
     
     await update.message.reply_text(
-        "💰 *Bot de Finanzas Personales*\n\n"
-        "Comandos disponibles:\n\n"
-        "🤖 Modo inteligente (con LLM):\n"
-        "   Simplemente escribe en lenguaje natural:\n"
-        "   • \"Gasté 5000 en café\"\n"
-        "   • \"Pagué 45000 de alquiler\"\n"
-        "   • \"Me llegó el sueldo de 200000\"\n\n"
-        "🎤 Mensajes de voz:\n"
-        "   ¡Ahora puedes enviar audios!\n"
-        "   El bot transcribe y procesa automáticamente\n"
-        "   Perfecto para usar con Action Button del iPhone\n\n"
-        "📝 Comandos manuales:\n"
-        "   `/gastar <monto> <descripcion>` - Registrar gasto\n"
-        "   `/ingreso <monto> <descripcion>` - Registrar ingreso\n\n"
-        "📊 Consultas:\n"
-        "   `/balance` - Ver balance actual\n"
-        "   `/stats` - Ver estadísticas completas\n\n"
-        "🗑️ Otros:\n"
-        "   `/limpiar` - Borrar todas las transacciones\n"
-        "   `/help` - Ver esta ayuda\n\n"
-        f"🧠 LLM: {llm_status}\n"
-        f"🎤 Audio: {voice_status}\n\n"
-        f"🆔 Tu Chat ID: `{chat_id}`\n"
-        f"_(Úsalo en Shortcuts de iOS)_",
+        _HELP_TEXT.format(chat_id=chat_id),
         parse_mode='Markdown'
     )
 
@@ -89,152 +552,130 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def gastar(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /gastar"""
     if not context.args or len(context.args) < 1:
-        await update.message.reply_text(
-            "❌ Uso: `/gastar <monto> [descripcion]`\n"
-            "Ejemplo: `/gastar 5000 Café`",
-            parse_mode='Markdown'
-        )
+        await update.message.reply_text(_USAGE_GASTAR, parse_mode='Markdown')
         return
     
     try:
         monto = float(context.args[0])
-        descripcion = ' '.join(context.args[1:]) if len(context.args) > 1 else "Gasto"
-        
+    except ValueError:
+        await update.message.reply_text("❌ Monto inválido. Debe ser un número.")
+        return
+    
+    descripcion = ' '.join(context.args[1:]) if len(context.args) > 1 else "Gasto"
+    placeholder = send_placeholder(update.message, "⏳ Registrando gasto...")
+    
+    try:
         # Crear YAML
         yaml_content = f"monto: {monto}\ndescripcion: {descripcion}"
         
-        # Ejecutar script
-        result = subprocess.run(
-            ['python', 'yaml_to_modal.py', '--yaml', yaml_content],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        # Enviar a Modal API
+        ok, out, err = await ingest_yaml(yaml_content)
         
-        if result.returncode == 0:
-            await update.message.reply_text(
+        if ok:
+            invalidate_stats()
+            await edit_placeholder(
+                update.message, placeholder,
                 f"✅ *Gasto registrado*\n\n"
-                f"💸 Monto: ${monto:,.0f} ARS\n"
+                f"💸 Monto: {_fmt_ars(monto)} ARS\n"
                 f"📝 Descripción: {descripcion}",
                 parse_mode='Markdown'
             )
         else:
-            await update.message.reply_text(f"❌ Error: {result.stderr}")
+            await edit_placeholder(update.message, placeholder, f"❌ Error: {err}")
     
-    except ValueError:
-        await update.message.reply_text("❌ Monto inválido. Debe ser un número.")
-    except subprocess.TimeoutExpired:
-        await update.message.reply_text("❌ Timeout - intenta de nuevo")
+    except asyncio.TimeoutError:
+        await edit_placeholder(update.message, placeholder, "❌ Timeout - intenta de nuevo")
     except Exception as e:
-        await update.message.reply_text(f"❌ Error: {e}")
+        await edit_placeholder(update.message, placeholder, f"❌ Error: {e}")
 
 
 async def ingreso(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /ingreso"""
     if not context.args or len(context.args) < 1:
-        await update.message.reply_text(
-            "❌ Uso: `/ingreso <monto> [descripcion]`\n"
-            "Ejemplo: `/ingreso 50000 Sueldo`",
-            parse_mode='Markdown'
-        )
+        await update.message.reply_text(_USAGE_INGRESO, parse_mode='Markdown')
         return
     
     try:
         monto = float(context.args[0])
-        descripcion = ' '.join(context.args[1:]) if len(context.args) > 1 else "Ingreso"
-        
+    except ValueError:
+        await update.message.reply_text("❌ Monto inválido. Debe ser un número.")
+        return
+    
+    descripcion = ' '.join(context.args[1:]) if len(context.args) > 1 else "Ingreso"
+    placeholder = send_placeholder(update.message, "⏳ Registrando ingreso...")
+    
+    try:
         # Crear YAML
         yaml_content = f"monto: {monto}\ndescripcion: {descripcion}\nes_ingreso: true"
         
-        # Ejecutar script
-        result = subprocess.run(
-            ['python', 'cli/yaml_to_modal.py', '--yaml', yaml_content],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        # Enviar a Modal API
+        ok, out, err = await ingest_yaml(yaml_content)
         
-        if result.returncode == 0:
-            await update.message.reply_text(
+        if ok:
+            invalidate_stats()
+            await edit_placeholder(
+                update.message, placeholder,
                 f"✅ *Ingreso registrado*\n\n"
-                f"💵 Monto: ${monto:,.0f} ARS\n"
+                f"💵 Monto: {_fmt_ars(monto)} ARS\n"
                 f"📝 Descripción: {descripcion}",
                 parse_mode='Markdown'
             )
         else:
-            await update.message.reply_text(f"❌ Error: {result.stderr}")
+            await edit_placeholder(update.message, placeholder, f"❌ Error: {err}")
     
-    except ValueError:
-        await update.message.reply_text("❌ Monto inválido. Debe ser un número.")
-    except subprocess.TimeoutExpired:
-        await update.message.reply_text("❌ Timeout - intenta de nuevo")
+    except asyncio.TimeoutError:
+        await edit_placeholder(update.message, placeholder, "❌ Timeout - intenta de nuevo")
     except Exception as e:
-        await update.message.reply_text(f"❌ Error: {e}")
+        await edit_placeholder(update.message, placeholder, f"❌ Error: {e}")
 
 
 async def balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /balance"""
-    await update.message.reply_text("⏳ Consultando balance...")
+    placeholder = send_placeholder(update.message, "⏳ Consultando balance...")
     
     try:
-        result = subprocess.run(
-            ['bash', './cli/finanzas_cli.sh', 'stats'],
-            capture_output=True,
-            text=True,
-            timeout=30
+        data = await get_stats()
+        
+        msg = (
+            "💰 *Balance Actual*\n\n"
+            f"💵 Ingresos: {_fmt_ars(data['total_income'])} ARS\n"
+            f"💸 Gastos: {_fmt_ars(data['total_expenses'])} ARS\n"
+            "━━━━━━━━━━━━━━━━━\n"
+            f"💰 *Balance: {_fmt_ars(data['balance'])} ARS*\n\n"
+            f"📝 Total transacciones: {data['total_transactions']}"
         )
         
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            
-            msg = "💰 *Balance Actual*\n\n"
-            msg += f"💵 Ingresos: ${data['total_income']:,.0f} ARS\n"
-            msg += f"💸 Gastos: ${data['total_expenses']:,.0f} ARS\n"
-            msg += f"━━━━━━━━━━━━━━━━━\n"
-            msg += f"💰 *Balance: ${data['balance']:,.0f} ARS*\n\n"
-            msg += f"📝 Total transacciones: {data['total_transactions']}"
-            
-            await update.message.reply_text(msg, parse_mode='Markdown')
-        else:
-            await update.message.reply_text(f"❌ Error: {result.stderr}")
+        await edit_placeholder(update.message, placeholder, msg, parse_mode='Markdown')
     
-    except subprocess.TimeoutExpired:
-        await update.message.reply_text("❌ Timeout - intenta de nuevo")
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        await edit_placeholder(update.message, placeholder, "❌ Timeout - intenta de nuevo")
     except Exception as e:
-        await update.message.reply_text(f"❌ Error: {e}")
+        await edit_placeholder(update.message, placeholder, f"❌ Error: {e}")
 
 
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /stats"""
-    await update.message.reply_text("⏳ Obteniendo estadísticas...")
+    placeholder = send_placeholder(update.message, "⏳ Obteniendo estadísticas...")
     
     try:
-        result = subprocess.run(
-            ['bash', './finanzas_cli.sh', 'stats'],
-            capture_output=True,
-            text=True,
-            timeout=30
+        data = await get_stats()
+        
+        msg = (
+            "📊 *Estadísticas Completas*\n\n"
+            f"💵 Ingresos totales: {_fmt_ars(data['total_income'])} ARS\n"
+            f"💸 Gastos totales: {_fmt_ars(data['total_expenses'])} ARS\n"
+            f"💰 Balance: {_fmt_ars(data['balance'])} ARS\n\n"
+            f"📝 Total transacciones: {data['total_transactions']}\n"
+            f"   • Gastos: {data['expense_count']}\n"
+            f"   • Ingresos: {data['income_count']}"
         )
         
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            
-            msg = "📊 *Estadísticas Completas*\n\n"
-            msg += f"💵 Ingresos totales: ${data['total_income']:,.0f} ARS\n"
-            msg += f"💸 Gastos totales: ${data['total_expenses']:,.0f} ARS\n"
-            msg += f"💰 Balance: ${data['balance']:,.0f} ARS\n\n"
-            msg += f"📝 Total transacciones: {data['total_transactions']}\n"
-            msg += f"   • Gastos: {data['expense_count']}\n"
-            msg += f"   • Ingresos: {data['income_count']}"
-            
-            await update.message.reply_text(msg, parse_mode='Markdown')
-        else:
-            await update.message.reply_text(f"❌ Error: {result.stderr}")
+        await edit_placeholder(update.message, placeholder, msg, parse_mode='Markdown')
     
-    except subprocess.TimeoutExpired:
-        await update.message.reply_text("❌ Timeout - intenta de nuevo")
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        await edit_placeholder(update.message, placeholder, "❌ Timeout - intenta de nuevo")
     except Exception as e:
-        await update.message.reply_text(f"❌ Error: {e}")
+        await edit_placeholder(update.message, placeholder, f"❌ Error: {e}")
 
 
 async def consulta(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -251,16 +692,11 @@ async def consulta(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(f"🤔 Analizando: _{pregunta}_", parse_mode='Markdown')
     
     try:
-        result = subprocess.run(
-            ['python', 'scripts/text_to_sql.py', pregunta],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
+        rc, out, err = await run_cmd(['python', 'scripts/text_to_sql.py', pregunta], timeout=60)
         
-        if result.returncode == 0:
+        if rc == 0:
             await update.message.reply_text(
-                f"📊 *Resultado:*\n\n```\n{result.stdout}\n```",
+                f"📊 *Resultado:*\n\n```\n{out.decode()}\n```",
                 parse_mode='Markdown'
             )
         else:
@@ -271,7 +707,7 @@ async def consulta(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 parse_mode='Markdown'
             )
     
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         await update.message.reply_text("❌ Timeout - la consulta tomó demasiado tiempo")
     except Exception as e:
         await update.message.reply_text(f"❌ Error: {e}")
@@ -292,23 +728,19 @@ async def confirmar_limpiar(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🗑️ Borrando todas las transacciones...")
     
     try:
-        result = subprocess.run(
-            ['bash', '-c', 'echo "SI" | python cli/yaml_to_modal.py --delete-all --verbose'],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        ok, out, err = await ingest_yaml(delete_all=True)
         
-        if result.returncode == 0:
+        if ok:
+            invalidate_stats()
             await update.message.reply_text(
                 "✅ *Todas las transacciones fueron eliminadas*\n\n"
                 "Puedes empezar de nuevo con `/gastar`",
                 parse_mode='Markdown'
             )
         else:
-            await update.message.reply_text(f"❌ Error: {result.stderr}")
+            await update.message.reply_text(f"❌ Error: {err}")
     
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         await update.message.reply_text("❌ Timeout - intenta de nuevo")
     except Exception as e:
         await update.message.reply_text(f"❌ Error: {e}")
@@ -319,6 +751,62 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await start(update, context)
 
 
+async def _process_user_text(message, placeholder, text, titulo, prefix=""):
+    """
+    Pipeline compartido por texto libre y audio: LLM → YAML → ingesta en
+    batch → un único mensaje final (editando el aviso `placeholder`)
+    
+    Los timeouts y errores inesperados se propagan al handler.
+    """
+    try:
+        result = await fetch_llm(text)
+    except TimeoutError:
+        await edit_placeholder(message, placeholder, "❌ Timeout - el LLM tardó demasiado")
+        return
+    except httpx.HTTPStatusError as e:
+        await edit_placeholder(
+            message, placeholder,
+            f"❌ Error del LLM: HTTP {e.response.status_code}\n{e.response.text}"
+        )
+        return
+    
+    if not result.get("success"):
+        await edit_placeholder(
+            message, placeholder,
+            f"❌ LLM falló: {result.get('error', 'Unknown error')}"
+        )
+        return
+    
+    yaml_output = result.get("yaml_output", "")
+    tokens_info = result.get("tokens", {})
+    
+    if not yaml_output:
+        await edit_placeholder(message, placeholder, "❌ LLM no generó YAML válido")
+        return
+    
+    # Detectar múltiples transacciones (separadas por ---) y procesarlas
+    # en un solo batch
+    yaml_docs = list(iter_yaml_docs(yaml_output))
+    successful, failed = await ingest_docs(yaml_docs)
+    cache_llm_result(text, yaml_output, ok=bool(successful) and not failed)
+    
+    if successful:
+        invalidate_stats()
+    
+    # Generar resumen
+    summary = format_summary(titulo, successful, failed, tokens_info)
+    await reply_llm_result(message, placeholder, prefix, yaml_output, yaml_docs, summary)
+
+
+async def _transcribe(context, voice):
+    """Descargar una nota de voz en memoria y transcribirla con Whisper"""
+    file = await context.bot.get_file(voice.file_id)
+    audio = await file.download_as_bytearray()
+    transcript = await transcribe_audio(audio)
+    return transcript.text
+
+
+@limit_per_chat
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Maneja mensajes de voz
@@ -336,178 +824,36 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
+    # Un solo mensaje que se va editando con cada etapa
+    placeholder = send_placeholder(update.message, "🎤 Transcribiendo audio...")
+    
     try:
-        # Indicar que está procesando
-        await update.message.reply_text("🎤 Transcribiendo audio...")
-        
-        # Obtener archivo de voz
-        voice = update.message.voice
-        file = await context.bot.get_file(voice.file_id)
-        
-        # Descargar audio temporalmente
-        audio_path = f"/tmp/voice_{voice.file_id}.ogg"
-        await file.download_to_drive(audio_path)
-        
-        # Transcribir con Whisper
-        with open(audio_path, 'rb') as audio_file:
-            transcript = openai_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="es"  # Español
-            )
-        
-        # Limpiar archivo temporal
-        os.remove(audio_path)
-        
-        texto_transcrito = transcript.text
-        
-        # Mostrar transcripción
-        await update.message.reply_text(
-            f"📝 *Transcripción:*\n_{texto_transcrito}_",
+        texto_transcrito = await _transcribe(context, update.message.voice)
+        # Sin itálica: el Markdown de Telegram no admite escapes dentro de una entidad
+        prefix = f"📝 *Transcripción:*\n{escape_markdown(texto_transcrito)}\n\n"
+        
+        # Mostrar la transcripción mientras corre el LLM
+        placeholder = asyncio.create_task(edit_placeholder(
+            update.message, placeholder,
+            f"{prefix}🧠 Procesando con LLM...",
             parse_mode='Markdown'
-        )
+        ))
         
         # Procesar el texto transcrito con el LLM (igual que texto normal)
-        await update.message.reply_text("🧠 Procesando con LLM...")
-        
-        # Llamar al LLM service
-        response = requests.post(
-            LLM_API_URL,
-            json={
-                "text": texto_transcrito,
-                "api_key": FINANZAS_API_KEY,
-            },
-            timeout=30
+        await _process_user_text(
+            update.message, placeholder, texto_transcrito,
+            "🎤 *{n} transacción(es) desde audio:*\n\n", prefix
         )
-        
-        if response.status_code != 200:
-            await update.message.reply_text(
-                f"❌ Error del LLM: HTTP {response.status_code}"
-            )
-            return
-        
-        result = response.json()
-        
-        if not result.get("success"):
-            await update.message.reply_text(
-                f"❌ LLM falló: {result.get('error', 'Unknown error')}"
-            )
-            return
-        
-        yaml_output = result.get("yaml_output", "")
-        tokens_info = result.get("tokens", {})
-        
-        if not yaml_output:
-            await update.message.reply_text("❌ LLM no generó YAML válido")
-            return
-        
-        # Detectar múltiples transacciones
-        yaml_docs = yaml_output.split('\n---\n')
-        num_transactions = len(yaml_docs)
-        
-        # Mostrar YAML generado COMPLETO para validación
-        await update.message.reply_text(
-            f"📝 *{num_transactions} transacción(es) detectada(s)*\n\n"
-            f"🔍 *YAML generado por el LLM:*",
-            parse_mode='Markdown'
-        )
-        
-        # Enviar el YAML completo
-        if len(yaml_output) <= 4000:
-            await update.message.reply_text(
-                f"```yaml\n{yaml_output}\n```",
-                parse_mode='Markdown'
-            )
-        else:
-            # Dividir por transacciones si es muy largo
-            for i, yaml_doc in enumerate(yaml_docs, 1):
-                yaml_doc_stripped = yaml_doc.strip()
-                if yaml_doc_stripped:
-                    await update.message.reply_text(
-                        f"```yaml\n# Transacción {i}\n{yaml_doc_stripped}\n```",
-                        parse_mode='Markdown'
-                    )
-        
-        # Procesar transacciones
-        import yaml
-        successful = []
-        failed = []
-        
-        for i, yaml_doc in enumerate(yaml_docs, 1):
-            yaml_doc = yaml_doc.strip()
-            if not yaml_doc:
-                continue
-            
-            try:
-                data = yaml.safe_load(yaml_doc)
-                if not data or 'monto' not in data:
-                    failed.append(f"Transacción {i}: falta campo 'monto'")
-                    continue
-                
-                # Enviar a Modal API
-                ingest_result = subprocess.run(
-                    ['python', 'cli/yaml_to_modal.py', '--yaml', yaml_doc],
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                
-                if ingest_result.returncode == 0:
-                    monto = data.get('monto', 0)
-                    descripcion = data.get('descripcion', 'Sin descripción')
-                    es_ingreso = data.get('es_ingreso', False)
-                    categoria = data.get('categoria', '')
-                    
-                    successful.append({
-                        'monto': monto,
-                        'descripcion': descripcion,
-                        'es_ingreso': es_ingreso,
-                        'categoria': categoria
-                    })
-                else:
-                    failed.append(f"Transacción {i}: {ingest_result.stderr[:100]}")
-            
-            except Exception as e:
-                failed.append(f"Transacción {i}: {str(e)[:100]}")
-        
-        # Generar resumen
-        if successful:
-            msg = f"🎤 *{len(successful)} transacción(es) desde audio:*\n\n"
-            
-            total_gastos = 0
-            total_ingresos = 0
-            
-            for tx in successful:
-                tipo_emoji = "💵" if tx['es_ingreso'] else "💸"
-                cat_text = f" ({tx['categoria']})" if tx['categoria'] else ""
-                msg += f"{tipo_emoji} ${tx['monto']:,.0f} - {tx['descripcion']}{cat_text}\n"
-                
-                if tx['es_ingreso']:
-                    total_ingresos += tx['monto']
-                else:
-                    total_gastos += tx['monto']
-            
-            balance_neto = total_ingresos - total_gastos
-            balance_emoji = "📈" if balance_neto > 0 else "📉" if balance_neto < 0 else "➖"
-            
-            msg += f"\n{balance_emoji} *Balance neto: "
-            if balance_neto > 0:
-                msg += f"+${balance_neto:,.0f}*"
-            elif balance_neto < 0:
-                msg += f"${balance_neto:,.0f}*"
-            else:
-                msg += f"${balance_neto:,.0f}*"
-            
-            await update.message.reply_text(msg, parse_mode='Markdown')
-        
-        if failed:
-            error_msg = "⚠️ *Errores:*\n\n" + "\n".join(failed)
-            await update.message.reply_text(error_msg, parse_mode='Markdown')
     
+    except httpx.TimeoutException:
+        await edit_placeholder(update.message, placeholder, "❌ Timeout - el LLM tardó demasiado")
+    except asyncio.TimeoutError:
+        await edit_placeholder(update.message, placeholder, "❌ Timeout - guardado tardó demasiado")
     except Exception as e:
-        await update.message.reply_text(f"❌ Error procesando audio: {e}")
+        await edit_placeholder(update.message, placeholder, f"❌ Error procesando audio: {e}")
 
 
+@limit_per_chat
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Maneja mensajes de texto libres (sin comando)
@@ -525,161 +871,35 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not text:
         return
     
-    # Indicar que está procesando
-    await update.message.reply_text("🧠 Analizando con LLM...")
+    # El aviso sale en paralelo con el LLM y luego se edita con el resultado
+    placeholder = send_placeholder(update.message, "🧠 Analizando con LLM...")
     
     try:
-        # Llamar al LLM service
-        response = requests.post(
-            LLM_API_URL,
-            json={
-                "text": text,
-                "api_key": FINANZAS_API_KEY,
-            },
-            timeout=30
-        )
-        
-        if response.status_code != 200:
-            await update.message.reply_text(
-                f"❌ Error del LLM: HTTP {response.status_code}\n{response.text}"
-            )
-            return
-        
-        result = response.json()
-        
-        if not result.get("success"):
-            await update.message.reply_text(
-                f"❌ LLM falló: {result.get('error', 'Unknown error')}"
-            )
-            return
-        
-        yaml_output = result.get("yaml_output", "")
-        tokens_info = result.get("tokens", {})
-        
-        if not yaml_output:
-            await update.message.reply_text("❌ LLM no generó YAML válido")
-            return
-        
-        # Detectar múltiples transacciones (separadas por ---)
-        yaml_docs = yaml_output.split('\n---\n')
-        num_transactions = len(yaml_docs)
-        
-        # Mostrar YAML generado COMPLETO para validación
-        await update.message.reply_text(
-            f"📝 *{num_transactions} transacción(es) detectada(s)*\n\n"
-            f"🔍 *YAML generado por el LLM:*",
-            parse_mode='Markdown'
+        await _process_user_text(
+            update.message, placeholder, text,
+            "✅ *{n} transacción(es) registrada(s):*\n\n"
         )
-        
-        # Enviar el YAML completo en un mensaje separado
-        # Si es muy largo, dividir en múltiples mensajes
-        if len(yaml_output) <= 4000:
-            await update.message.reply_text(
-                f"```yaml\n{yaml_output}\n```",
-                parse_mode='Markdown'
-            )
-        else:
-            # Dividir por transacciones si es muy largo
-            for i, yaml_doc in enumerate(yaml_docs, 1):
-                yaml_doc = yaml_doc.strip()
-                if yaml_doc:
-                    await update.message.reply_text(
-                        f"```yaml\n# Transacción {i}\n{yaml_doc}\n```",
-                        parse_mode='Markdown'
-                    )
-        
-        # Procesar cada transacción
-        import yaml
-        successful = []
-        failed = []
-        
-        for i, yaml_doc in enumerate(yaml_docs, 1):
-            yaml_doc = yaml_doc.strip()
-            if not yaml_doc:
-                continue
-            
-            try:
-                # Validar que sea YAML válido
-                data = yaml.safe_load(yaml_doc)
-                if not data or 'monto' not in data:
-                    failed.append(f"Transacción {i}: falta campo 'monto'")
-                    continue
-                
-                # Enviar a Modal API
-                ingest_result = subprocess.run(
-                    ['python', 'cli/yaml_to_modal.py', '--yaml', yaml_doc],
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                
-                if ingest_result.returncode == 0:
-                    monto = data.get('monto', 0)
-                    descripcion = data.get('descripcion', 'Sin descripción')
-                    es_ingreso = data.get('es_ingreso', False)
-                    categoria = data.get('categoria', '')
-                    
-                    successful.append({
-                        'monto': monto,
-                        'descripcion': descripcion,
-                        'es_ingreso': es_ingreso,
-                        'categoria': categoria
-                    })
-                else:
-                    failed.append(f"Transacción {i}: {ingest_result.stderr[:100]}")
-            
-            except Exception as e:
-                failed.append(f"Transacción {i}: {str(e)[:100]}")
-        
-        # Generar resumen
-        if successful:
-            msg = f"✅ *{len(successful)} transacción(es) registrada(s):*\n\n"
-            
-            total_gastos = 0
-            total_ingresos = 0
-            
-            for tx in successful:
-                tipo_emoji = "💵" if tx['es_ingreso'] else "💸"
-                cat_text = f" ({tx['categoria']})" if tx['categoria'] else ""
-                msg += f"{tipo_emoji} ${tx['monto']:,.0f} - {tx['descripcion']}{cat_text}\n"
-                
-                if tx['es_ingreso']:
-                    total_ingresos += tx['monto']
-                else:
-                    total_gastos += tx['monto']
-            
-            # Calcular balance neto de estas transacciones
-            balance_neto = total_ingresos - total_gastos
-            balance_emoji = "📈" if balance_neto > 0 else "📉" if balance_neto < 0 else "➖"
-            
-            msg += f"\n{balance_emoji} *Balance neto: "
-            if balance_neto > 0:
-                msg += f"+${balance_neto:,.0f}*"
-            elif balance_neto < 0:
-                msg += f"${balance_neto:,.0f}*"
-            else:
-                msg += f"${balance_neto:,.0f}*"
-            
-            # Agregar info de tokens si está disponible
-            if tokens_info and tokens_info.get('total_tokens'):
-                msg += f"\n\n🔢 Tokens: {tokens_info['total_tokens']}"
-            
-            await update.message.reply_text(msg, parse_mode='Markdown')
-        
-        if failed:
-            error_msg = "⚠️ *Errores:*\n\n" + "\n".join(failed)
-            await update.message.reply_text(error_msg, parse_mode='Markdown')
-    
-    except requests.Timeout:
-        await update.message.reply_text("❌ Timeout - el LLM tardó demasiado")
-    except subprocess.TimeoutExpired:
-        await update.message.reply_text("❌ Timeout - guardado tardó demasiado")
+    
+    except httpx.TimeoutException:
+        await edit_placeholder(update.message, placeholder, "❌ Timeout - el LLM tardó demasiado")
+    except asyncio.TimeoutError:
+        await edit_placeholder(update.message, placeholder, "❌ Timeout - guardado tardó demasiado")
     except Exception as e:
-        await update.message.reply_text(f"❌ Error: {e}")
+        await edit_placeholder(update.message, placeholder, f"❌ Error: {e}")
+
+
+async def _on_shutdown(app: Application):
+    """Cerrar el cliente HTTP y el pool de threads al apagar el bot"""
+    await _http.aclose()
+    _POOL.shutdown(wait=False)
 
 
 def main():
     """Iniciar bot"""
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+    # httpx loguea cada request en INFO; solo interesan los problemas
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    
     print(f"🤖 Iniciando bot de Telegram...")
     print(f"   Token: {TELEGRAM_TOKEN[:10]}...")
     
@@ -688,7 +908,24 @@ def main():
     else:
         print(f"   ⚠️  LLM: No configurado (solo comandos manuales)")
     
-    app = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Updates concurrentes: un /consulta lento no bloquea un /balance de otro chat.
+    # HTTP/2 multiplexa las varias respuestas de cada handler en una conexión
+    app = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .request(HTTPXRequest(
+            http_version="2",
+            connection_pool_size=32,
+            read_timeout=30,
+            write_timeout=30,
+            connect_timeout=10,
+            pool_timeout=5
+        ))
+        .get_updates_request(HTTPXRequest(http_version="2", connection_pool_size=16))
+        .concurrent_updates(True)
+        .post_shutdown(_on_shutdown)
+        .build()
+    )
     
     # Comandos
     app.add_handler(CommandHandler("start", start))
@@ -713,7 +950,17 @@ def main():
     print("   🎤 También puedes enviar mensajes de voz!")
     print("   Presiona Ctrl+C para detener\n")
     
-    app.run_polling()
+    if WEBHOOK_URL:
+        # Telegram empuja cada update: sin la espera del long-poll
+        print(f"   🌐 Webhook: {WEBHOOK_URL.rstrip('/')}/<token> (puerto {WEBHOOK_PORT})")
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=WEBHOOK_PORT,
+            url_path=TELEGRAM_TOKEN,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{TELEGRAM_TOKEN}"
+        )
+    else:
+        app.run_polling()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,48 @@
+"""
+Helpers compartidos por test_api.py y test_api_local.py (módulo común, no
+conftest: pytest desaconseja importar conftest.py)
+"""
+import time
+import httpx
+from types import MappingProxyType
+
+
+# Respuestas transitorias (p.ej. 503 mientras Modal levanta el contenedor)
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Reintentar respuestas transitorias con backoff exponencial sobre la misma conexión"""
+    
+    def __init__(self, transport: httpx.BaseTransport, retries: int = 3, backoff: float = 0.3):
+        self.transport = transport
+        self.retries = retries
+        self.backoff = backoff
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(self.retries):
+            response = self.transport.handle_request(request)
+            if response.status_code not in _RETRY_STATUSES:
+                return response
+            response.close()
+            time.sleep(self.backoff * 2 ** attempt)
+        return self.transport.handle_request(request)
+    
+    def close(self):
+        self.transport.close()
+
+
+# Payloads compartidos (inmutables); orjson no serializa mappingproxy,
+# por eso se pasan como {**_BASE_TX} o con el override del test
+_BASE_TX = MappingProxyType({
+    'amount': 100,
+    'currency': 'ARS',
+    'description': 'Test transaction',
+    'category': 'test'
+})
+_MINIMAL_TX = MappingProxyType({'amount': 100, 'description': 'Test'})
+_NO_AMOUNT_TX = MappingProxyType({'description': 'Test without amount'})
+_INVALID_KEY_HEADERS = MappingProxyType({
+    'X-API-Key': 'invalid_key_123',
+    'Content-Type': 'application/json'
+})
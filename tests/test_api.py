@@ -8,21 +8,25 @@ Para ejecutar estos tests:
 3. Ejecutar: pytest test_api.py -v
 """
 import os
+import functools
+import httpx
+import msgspec
+import orjson
 import pytest
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 from datetime import datetime
+from dotenv import load_dotenv
+from typing import Any, List, Optional
 
+from _helpers import RetryTransport, _BASE_TX, _MINIMAL_TX, _NO_AMOUNT_TX, _INVALID_KEY_HEADERS
 
-# Cargar configuración
+
+# Cargar configuración (una sola vez por proceso); override=False respeta
+# las variables ya exportadas y completa las que falten desde .env
+@functools.cache
 def load_env():
-    env_path = '.env'
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ.setdefault(key.strip(), value.strip())
+    load_dotenv('.env', override=False)
 
 
 load_env()
@@ -30,241 +34,235 @@ load_env()
 API_URL = os.environ.get('MODAL_API_URL')
 API_KEY = os.environ.get('FINANZAS_API_KEY')
 
+# Tests contra la API desplegada (ver test_api_local.py para los clientes contra la API simulada).
 # Skip tests si no hay configuración
-pytestmark = pytest.mark.skipif(
-    not API_URL or not API_KEY,
-    reason="MODAL_API_URL y FINANZAS_API_KEY deben estar configurados en .env"
-)
-
-
-@pytest.fixture
-def headers():
-    """Headers para requests"""
-    return {
-        'X-API-Key': API_KEY,
-        'Content-Type': 'application/json'
-    }
+pytestmark = [
+    pytest.mark.remote,
+    pytest.mark.skipif(
+        not API_URL or not API_KEY,
+        reason="MODAL_API_URL y FINANZAS_API_KEY deben estar configurados en .env"
+    ),
+]
+
+
+# Opciones del cliente compartido (ver api_client)
+CLIENT_OPTIONS = MappingProxyType({
+    'headers': {'X-API-Key': API_KEY or ''},
+    'timeout': 10.0,
+})
+
+
+_JSON_HEADERS = MappingProxyType({'Content-Type': 'application/json'})
+
+
+def _json(response: httpx.Response) -> Any:
+    """Decodificar el body de la respuesta con orjson"""
+    return orjson.loads(response.content)
+
+
+def _post(client: httpx.Client, url: str, payload: Any, headers=None) -> httpx.Response:
+    """POST con el body serializado por orjson"""
+    return client.post(url, content=orjson.dumps(payload), headers={**_JSON_HEADERS, **(headers or {})})
+
+
+# Esquemas de respuesta: decodificar valida tipos y campos requeridos en una pasada
+class QueryResult(msgspec.Struct):
+    success: bool
+    columns: List[str]
+    rows: List[List[Any]]
+    row_count: int
+
+
+class Stats(msgspec.Struct):
+    total_income: float
+    total_expenses: float
+    balance: float
+    total_transactions: int
+    expense_count: int
+    income_count: int
+
+
+class RecentTransaction(msgspec.Struct):
+    id: str
+    date: str
+    amount: float
+    currency: str
+    is_income: bool
+    expense_type: Optional[str] = None
+    category: Optional[str] = None
+    payment_method: Optional[str] = None
+    money_source: Optional[str] = None
+    description: Optional[str] = None
+
 
+class RecentTransactions(msgspec.Struct):
+    success: bool
+    count: int
+    transactions: List[RecentTransaction]
 
-def test_health_check():
+
+@pytest.fixture(scope="session")
+def api_client():
+    """
+    Cliente compartido, creado una sola vez por worker y solo si hay tests
+    que lo usen: HTTP/2 multiplexa todos los requests sobre una conexión TCP+TLS
+    """
+    transport = RetryTransport(httpx.HTTPTransport(
+        http2=True,
+        retries=1,  # Errores de conexión
+        limits=httpx.Limits(max_keepalive_connections=5)
+    ))
+    client = httpx.Client(base_url=API_URL, transport=transport, **CLIENT_OPTIONS)
+    yield client
+    client.close()
+
+
+@pytest.mark.flaky(reruns=1, reruns_delay=1)
+def test_health_check(api_client):
     """Test endpoint /health"""
-    response = requests.get(f"{API_URL}/health")
+    response = api_client.get("/health")
     assert response.status_code == 200
     
-    data = response.json()
+    data = _json(response)
     assert data['status'] == 'healthy'
     assert data['database'] == 'connected'
 
 
-def test_root_endpoint():
+def test_root_endpoint(api_client):
     """Test endpoint raíz"""
-    response = requests.get(API_URL)
+    response = api_client.get("/")
     assert response.status_code == 200
     
-    data = response.json()
+    data = _json(response)
     assert 'app' in data
     assert 'version' in data
 
 
-def test_ingest_transaction(headers):
+@pytest.mark.flaky(reruns=1, reruns_delay=1)
+def test_ingest_transaction(api_client):
     """Test insertar transacción"""
-    transaction = {
-        'amount': 100,
-        'currency': 'ARS',
-        'description': 'Test transaction',
-        'category': 'test'
-    }
-    
-    response = requests.post(
-        f"{API_URL}/ingest",
-        headers=headers,
-        json=transaction
-    )
+    response = _post(api_client, "/ingest", {**_BASE_TX})
     
     assert response.status_code == 200
     
-    data = response.json()
+    data = _json(response)
     assert data['success'] is True
     assert 'id' in data
     assert len(data['id']) > 0
 
 
-def test_ingest_without_auth():
-    """Test que ingest requiere autenticación"""
-    transaction = {
-        'amount': 100,
-        'description': 'Test'
-    }
-    
-    response = requests.post(
-        f"{API_URL}/ingest",
-        json=transaction
-    )
-    
-    assert response.status_code == 403  # Forbidden or 401
-
-
-def test_ingest_invalid_api_key():
-    """Test con API key inválida"""
-    headers = {
-        'X-API-Key': 'invalid_key_123',
-        'Content-Type': 'application/json'
-    }
+@pytest.mark.flaky(reruns=1, reruns_delay=1)
+def test_ingest_batch(api_client):
+    """Test insertar varias transacciones con /ingest_batch"""
+    response = _post(api_client, "/ingest_batch", [{**_BASE_TX}, {**_MINIMAL_TX}])
     
-    transaction = {
-        'amount': 100,
-        'description': 'Test'
-    }
-    
-    response = requests.post(
-        f"{API_URL}/ingest",
-        headers=headers,
-        json=transaction
-    )
+    assert response.status_code == 200
     
-    assert response.status_code == 401
-
-
-def test_ingest_missing_amount(headers):
-    """Test que falla sin amount"""
-    transaction = {
-        'description': 'Test without amount'
-    }
+    data = _json(response)
+    assert data['success'] is True
+    assert len(data['ids']) == 2
+    assert len(set(data['ids'])) == 2
     
-    response = requests.post(
-        f"{API_URL}/ingest",
-        headers=headers,
-        json=transaction
-    )
+    # Lista vacía: 400
+    assert _post(api_client, "/ingest_batch", []).status_code == 400
+
+
+# auth: None = sin API key (403), 'invalid' = API key inválida (401),
+# 'valid' = api_client con la API key configurada
+@pytest.mark.parametrize("endpoint,payload,auth,expected", [
+    ("/ingest", _MINIMAL_TX, None, 403),
+    ("/ingest", _MINIMAL_TX, 'invalid', 401),
+    ("/ingest", _NO_AMOUNT_TX, 'valid', 422),
+    ("/query", {'sql': 'DELETE FROM transactions WHERE id = "123"'}, 'valid', 422),
+    ("/query", {'sql': 'UPDATE transactions SET amount = 0'}, 'valid', 422),
+], ids=["without_auth", "invalid_api_key", "missing_amount", "unsafe_delete", "unsafe_update"])
+def test_rejects(endpoint, payload, auth, expected, api_client):
+    """Test que la API rechaza requests sin auth, inválidos o con SQL peligroso"""
+    if auth is None:
+        # Cliente nuevo para no heredar la API key válida
+        with httpx.Client(base_url=API_URL) as client:
+            response = _post(client, endpoint, {**payload})
+    else:
+        headers = _INVALID_KEY_HEADERS if auth == 'invalid' else None
+        response = _post(api_client, endpoint, {**payload}, headers=headers)
     
-    assert response.status_code == 422  # Validation error
+    assert response.status_code == expected
 
 
-def test_query_safe_select(headers):
+def test_query_safe_select(api_client):
     """Test ejecutar query SELECT"""
     query = {
         'sql': 'SELECT COUNT(*) as count FROM transactions'
     }
     
-    response = requests.post(
-        f"{API_URL}/query",
-        headers=headers,
-        json=query
-    )
+    response = _post(api_client, "/query", query)
     
     assert response.status_code == 200
     
-    data = response.json()
-    assert data['success'] is True
-    assert 'columns' in data
-    assert 'rows' in data
-    assert data['row_count'] >= 0
-
-
-def test_query_unsafe_delete(headers):
-    """Test que rechaza DELETE"""
-    query = {
-        'sql': 'DELETE FROM transactions WHERE id = "123"'
-    }
-    
-    response = requests.post(
-        f"{API_URL}/query",
-        headers=headers,
-        json=query
-    )
-    
-    assert response.status_code == 422  # Validation error
-
-
-def test_query_unsafe_update(headers):
-    """Test que rechaza UPDATE"""
-    query = {
-        'sql': 'UPDATE transactions SET amount = 0'
-    }
-    
-    response = requests.post(
-        f"{API_URL}/query",
-        headers=headers,
-        json=query
-    )
-    
-    assert response.status_code == 422
+    data = msgspec.json.decode(response.content, type=QueryResult)
+    assert data.success is True
+    assert data.row_count >= 0
 
 
-def test_stats_endpoint(headers):
+def test_stats_endpoint(api_client):
     """Test endpoint /stats"""
-    response = requests.get(
-        f"{API_URL}/stats",
-        headers=headers
+    response = api_client.get(
+        "/stats"
     )
     
     assert response.status_code == 200
     
-    data = response.json()
-    assert 'total_income' in data
-    assert 'total_expenses' in data
-    assert 'balance' in data
-    assert 'total_transactions' in data
-    assert 'expense_count' in data
-    assert 'income_count' in data
+    msgspec.json.decode(response.content, type=Stats)
 
 
-def test_recent_transactions(headers):
+def test_recent_transactions(api_client):
     """Test endpoint /transactions/recent"""
-    response = requests.get(
-        f"{API_URL}/transactions/recent?limit=5",
-        headers=headers
+    response = api_client.get(
+        "/transactions/recent?limit=5"
     )
     
     assert response.status_code == 200
     
-    data = response.json()
-    assert data['success'] is True
-    assert 'transactions' in data
-    assert 'count' in data
-    assert data['count'] <= 5
+    data = msgspec.json.decode(response.content, type=RecentTransactions)
+    assert data.success is True
+    assert data.count == len(data.transactions) <= 5
 
 
-def test_full_flow(headers):
+@pytest.mark.flaky(reruns=1, reruns_delay=1)
+def test_full_flow(api_client):
     """Test flujo completo: insert + query + stats"""
     # 1. Insertar transacción de test
     transaction = {
+        **_BASE_TX,
         'amount': 999.99,
-        'currency': 'ARS',
         'description': 'Integration test transaction',
-        'category': 'test',
         'payment_method': 'cash'
     }
     
-    response = requests.post(
-        f"{API_URL}/ingest",
-        headers=headers,
-        json=transaction
-    )
+    response = _post(api_client, "/ingest", transaction)
     assert response.status_code == 200
-    transaction_id = response.json()['id']
+    transaction_id = _json(response)['id']
     
-    # 2. Verificar que aparece en query
+    # 2 y 3. Query y stats en paralelo (httpx.Client es thread-safe)
     query = {
         'sql': f"SELECT * FROM transactions WHERE id = '{transaction_id}'"
     }
     
-    response = requests.post(
-        f"{API_URL}/query",
-        headers=headers,
-        json=query
-    )
-    assert response.status_code == 200
-    data = response.json()
-    assert data['row_count'] == 1
-    assert data['rows'][0][2] == 999.99  # amount column
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        query_future = executor.submit(_post, api_client, "/query", query)
+        stats_future = executor.submit(api_client.get, "/stats")
+        response, stats_response = query_future.result(), stats_future.result()
     
-    # 3. Verificar stats
-    response = requests.get(
-        f"{API_URL}/stats",
-        headers=headers
-    )
+    # Verificar que aparece en query
     assert response.status_code == 200
+    data = msgspec.json.decode(response.content, type=QueryResult)
+    assert data.row_count == 1
+    assert data.rows[0][2] == 999.99  # amount column
+    
+    # Verificar stats (esquema incluido)
+    assert stats_response.status_code == 200
+    stats = msgspec.json.decode(stats_response.content, type=Stats)
+    assert stats.total_transactions >= 1
 
 
 if __name__ == '__main__':
@@ -0,0 +1,122 @@
+"""
+Tests locales de los clientes de la API: cli/yaml_to_modal.py contra la API
+de Modal simulada con un adapter de requests (sin red ni despliegue), y el
+RetryTransport de _helpers.py con httpx.MockTransport.
+
+Los tests contra la API real están en test_api.py (marcados como `remote`).
+"""
+import json
+import httpx
+import pytest
+import requests
+
+import yaml_to_modal
+from _helpers import RetryTransport, _BASE_TX, _MINIMAL_TX
+
+
+API_URL = 'https://finanzas.test'
+API_KEY = 'test-key'
+
+
+class MockAdapter(requests.adapters.BaseAdapter):
+    """Adapter de requests que responde con handler(request) -> (status, body)"""
+    
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+        self.timeouts = []
+    
+    def send(self, request, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        status, body = self.handler(request)
+        
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        response.headers['Content-Type'] = 'application/json'
+        response.url = request.url
+        response.request = request
+        return response
+    
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    """Montar un MockAdapter en todas las Session (requests.post/delete crean una por llamada)"""
+    def install(handler):
+        adapter = MockAdapter(handler)
+        monkeypatch.setattr(requests.Session, 'get_adapter', lambda self, url: adapter)
+        return adapter
+    return install
+
+
+def test_send_batch_to_modal_contract(mock_api):
+    """Test que send_batch_to_modal manda la lista a /ingest_batch con API key y timeout"""
+    def handler(request):
+        assert request.method == 'POST'
+        assert request.url == API_URL + '/ingest_batch'
+        assert request.headers['X-API-Key'] == API_KEY
+        assert json.loads(request.body) == [{**_BASE_TX}, {**_MINIMAL_TX}]
+        return 200, {'success': True, 'ids': ['a', 'b'], 'message': 'ok'}
+    
+    adapter = mock_api(handler)
+    response = yaml_to_modal.send_batch_to_modal([{**_BASE_TX}, {**_MINIMAL_TX}], API_URL + '/', API_KEY)
+    
+    assert response['ids'] == ['a', 'b']
+    assert adapter.timeouts == [yaml_to_modal.HTTP_TIMEOUT]
+
+
+def test_send_batch_to_modal_http_error(mock_api):
+    """Test que un error HTTP se convierte en RuntimeError"""
+    mock_api(lambda request: (401, {'detail': 'Invalid API key'}))
+    
+    with pytest.raises(RuntimeError, match="401"):
+        yaml_to_modal.send_batch_to_modal([{**_MINIMAL_TX}], API_URL, API_KEY)
+
+
+def test_send_batch_to_modal_requires_config(monkeypatch):
+    """Test que sin URL configurada falla antes de hacer la request"""
+    monkeypatch.delenv('MODAL_API_URL', raising=False)
+    
+    with pytest.raises(ValueError, match="MODAL_API_URL"):
+        yaml_to_modal.send_batch_to_modal([{**_MINIMAL_TX}], api_key=API_KEY)
+
+
+def test_delete_transaction_contract(mock_api):
+    """Test que delete_transaction usa DELETE /transactions/<id> con API key"""
+    def handler(request):
+        assert request.method == 'DELETE'
+        assert request.url == API_URL + '/transactions/tx-1'
+        assert request.headers['X-API-Key'] == API_KEY
+        return 200, {'success': True, 'message': 'Transacción tx-1 eliminada'}
+    
+    adapter = mock_api(handler)
+    
+    assert yaml_to_modal.delete_transaction('tx-1', API_URL, API_KEY)['success'] is True
+    assert adapter.timeouts == [yaml_to_modal.HTTP_TIMEOUT]
+
+
+def test_retry_transport_retries_transient_status():
+    """Test que RetryTransport reintenta un 503 y devuelve la respuesta siguiente"""
+    statuses = iter([503, 502, 200])
+    calls = []
+    
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(next(statuses), json={'status': 'healthy'})
+    
+    transport = RetryTransport(httpx.MockTransport(handler), backoff=0)
+    with httpx.Client(base_url=API_URL, transport=transport) as client:
+        response = client.get("/health")
+    
+    assert response.status_code == 200
+    assert calls == ['/health'] * 3
+
+
+def test_retry_transport_gives_up():
+    """Test que RetryTransport devuelve el último error tras agotar los reintentos"""
+    transport = RetryTransport(httpx.MockTransport(lambda request: httpx.Response(503)), retries=2, backoff=0)
+    with httpx.Client(base_url=API_URL, transport=transport) as client:
+        assert client.get("/health").status_code == 503
@@ -0,0 +1,234 @@
+"""
+Tests para los helpers puros de telegram/bot.py
+"""
+import os
+import sys
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+# bot.py se corre como script desde telegram/; sin token sale al importarse
+pytest.importorskip("telegram.ext")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'telegram'))
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '1:test')
+
+import bot  # noqa: E402
+
+
+def test_iter_yaml_docs_splits_and_strips():
+    """Test que separa por --- y omite documentos vacíos"""
+    blob = "\nmonto: 100\ndescripcion: Café\n---\n\n---\nmonto: 50  \n"
+    
+    assert list(bot.iter_yaml_docs(blob)) == ["monto: 100\ndescripcion: Café", "monto: 50"]
+
+
+def test_iter_yaml_docs_single_doc():
+    """Test documento único sin separador"""
+    assert list(bot.iter_yaml_docs("monto: 100")) == ["monto: 100"]
+    assert list(bot.iter_yaml_docs("   ")) == []
+
+
+def test_format_summary_totals_and_errors():
+    """Test resumen con gastos, ingresos, balance neto, tokens y errores"""
+    successful = [
+        {'monto': 1500.0, 'descripcion': 'Café', 'es_ingreso': False, 'categoria': 'comida'},
+        {'monto': 50000.0, 'descripcion': 'Sueldo', 'es_ingreso': True, 'categoria': ''},
+    ]
+    summary = bot.format_summary("✅ *{n} transacción(es):*\n\n", successful, ["Transacción 3: error"],
+                                 {'total_tokens': 42})
+    
+    assert summary.startswith("✅ *2 transacción(es):*\n\n")
+    assert "💸 $1,500 - Café (comida)\n" in summary
+    assert "💵 $50,000 - Sueldo\n" in summary
+    assert "📈 *Balance neto: +$48,500*" in summary
+    assert "🔢 Tokens: 42" in summary
+    assert summary.endswith("⚠️ *Errores:*\n\nTransacción 3: error")
+
+
+def test_format_summary_only_errors():
+    """Test resumen sin transacciones registradas"""
+    assert bot.format_summary("{n}", [], ["x"]) == "⚠️ *Errores:*\n\nx"
+
+
+def test_format_summary_escapes_markdown():
+    """Test que descripciones y errores no rompen el Markdown del mensaje"""
+    successful = [{'monto': 10.0, 'descripcion': 'pago_*tarjeta*', 'es_ingreso': False, 'categoria': 'gastos_fijos'}]
+    summary = bot.format_summary("", successful, ["Transacción 2: falta es_ingreso"])
+    
+    assert "pago\\_\\*tarjeta\\* (gastos\\_fijos)" in summary
+    assert "falta es\\_ingreso" in summary
+
+
+def test_send_with_fallback_retries_without_markdown():
+    """Test que si Telegram rechaza el Markdown se reenvía como texto plano"""
+    calls = []
+    
+    async def send(text, **kwargs):
+        calls.append(kwargs)
+        if 'parse_mode' in kwargs:
+            raise bot.BadRequest("Can't parse entities: can't find end of the entity")
+        return text
+    
+    assert asyncio.run(bot.send_with_fallback(send, "_roto", parse_mode='Markdown')) == "_roto"
+    assert calls == [{'parse_mode': 'Markdown'}, {}]
+
+
+def test_send_with_fallback_propagates_other_errors():
+    """Test que otros BadRequest no se tapan"""
+    async def send(text, **kwargs):
+        raise bot.BadRequest("Message is not modified")
+    
+    with pytest.raises(bot.BadRequest):
+        asyncio.run(bot.send_with_fallback(send, "x", parse_mode='Markdown'))
+
+
+def test_cache_llm_result_only_keeps_clean_ingests():
+    """Test que un YAML con errores no se cachea y uno exitoso sí"""
+    bot.cache_llm_result("Gasté 100  en café", "monto: 100", ok=True)
+    assert bot._llm_cache[bot._llm_key("gasté 100 en CAFÉ")] == "monto: 100"
+    
+    # Reenviar el mismo texto tras un fallo descarta la entrada
+    bot.cache_llm_result("gasté 100 en café", "monto: 100", ok=False)
+    assert bot._llm_key("gasté 100 en café") not in bot._llm_cache
+    
+    bot.cache_llm_result("texto malo", "descripcion: x", ok=False)
+    assert bot._llm_key("texto malo") not in bot._llm_cache
+
+
+def _failing(errors):
+    """coro_fn que lanza los errores dados en orden y después devuelve 'ok'"""
+    calls = []
+    
+    async def coro_fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return 'ok'
+    
+    return coro_fn, calls
+
+
+def _status_error(status):
+    request = httpx.Request('GET', 'https://api.test/stats')
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+
+def test_retry_recovers_from_transient_errors():
+    """Test que reintenta errores de red y 5xx"""
+    coro_fn, calls = _failing([httpx.ConnectError("down"), _status_error(503)])
+    
+    assert asyncio.run(bot._retry(coro_fn, base=0)) == 'ok'
+    assert len(calls) == 3
+
+
+def test_retry_does_not_retry_client_errors():
+    """Test que un 4xx se propaga sin reintentar"""
+    coro_fn, calls = _failing([_status_error(401)])
+    
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(bot._retry(coro_fn, base=0))
+    assert len(calls) == 1
+
+
+def test_retry_gives_up_after_attempts():
+    """Test que tras agotar los intentos propaga el último error"""
+    coro_fn, calls = _failing([httpx.ReadTimeout("slow")] * 3)
+    
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(bot._retry(coro_fn, attempts=2, base=0))
+    assert len(calls) == 2
+
+
+def test_get_stats_skips_cache_if_invalidated_in_flight(monkeypatch):
+    """Test que una invalidación durante la consulta no deja totales viejos en el cache"""
+    monkeypatch.setattr(bot, 'MODAL_API_URL', 'https://api.test')
+    monkeypatch.setattr(bot, '_stats_cache', {"t": 0.0, "data": None, "gen": 0})
+    
+    async def get(url, **kwargs):
+        bot.invalidate_stats()  # p.ej. una ingesta que termina mientras tanto
+        return httpx.Response(200, content=b'{"balance": 1}', request=httpx.Request('GET', url))
+    
+    monkeypatch.setattr(bot._http, 'get', get)
+    
+    assert asyncio.run(bot.get_stats()) == {'balance': 1}
+    assert bot._stats_cache["data"] is None
+
+
+def test_ingest_docs_builds_summary_entries(monkeypatch):
+    """Test que ingest_docs arma el resumen desde 'data' de ingest_batch (con defaults) y acorta los errores"""
+    async def run_blocking(fn, *args):
+        return fn(*args)
+    
+    def ingest_batch(yaml_docs):
+        return [
+            {'success': True, 'index': 1, 'result': {'id': 'a'},
+             'data': {'amount': 100.0, 'currency': 'ARS', 'is_income': True}},
+            {'success': False, 'index': 2, 'error': 'x' * 150},
+        ]
+    
+    monkeypatch.setattr(bot, 'run_blocking', run_blocking)
+    monkeypatch.setattr(bot, '_ingest_batch', ingest_batch)
+    
+    successful, failed = asyncio.run(bot.ingest_docs(["monto: 100", "descripcion: Sin monto"]))
+    
+    assert successful == [{'monto': 100.0, 'descripcion': 'Sin descripción', 'es_ingreso': True, 'categoria': ''}]
+    assert failed == ["Transacción 2: " + 'x' * 100]
+
+
+class _FakeMessage:
+    """Mensaje de Telegram mínimo: reply_text devuelve un mensaje cuyo edit_text queda registrado"""
+    
+    def __init__(self):
+        self.texts = []
+    
+    async def reply_text(self, text, **kwargs):
+        self.texts.append(text)
+        return self
+    
+    async def edit_text(self, text, **kwargs):
+        self.texts.append(text)
+        return self
+
+
+@pytest.mark.parametrize("command", ["balance", "stats"])
+def test_stats_commands_report_http_timeout(command, monkeypatch):
+    """Test que un timeout de httpx en /stats se informa como timeout, no como error vacío"""
+    async def get_stats():
+        raise httpx.ReadTimeout("")
+    
+    monkeypatch.setattr(bot, 'get_stats', get_stats)
+    message = _FakeMessage()
+    update = type('Update', (), {'message': message})()
+    
+    asyncio.run(getattr(bot, command)(update, None))
+    
+    assert message.texts[-1] == "❌ Timeout - intenta de nuevo"
+
+
+@pytest.mark.parametrize("handler", ["handle_text", "handle_voice"])
+@pytest.mark.parametrize("error,expected", [
+    (httpx.ReadTimeout(""), "❌ Timeout - el LLM tardó demasiado"),
+    (asyncio.TimeoutError(), "❌ Timeout - guardado tardó demasiado"),
+])
+def test_text_and_voice_report_timeouts_alike(handler, error, expected, monkeypatch):
+    """Test que texto y audio informan igual los timeouts del LLM y de la ingesta"""
+    async def process(*args, **kwargs):
+        raise error
+    
+    async def transcribe(context, voice):
+        return "gasté 100 en café"
+    
+    monkeypatch.setattr(bot, '_process_user_text', process)
+    monkeypatch.setattr(bot, '_transcribe', transcribe)
+    monkeypatch.setattr(bot, 'openai_client', object())
+    monkeypatch.setattr(bot, 'LLM_API_URL', 'https://llm.test')
+    
+    message = _FakeMessage()
+    message.text = message.voice = "gasté 100 en café"
+    update = type('Update', (), {'message': message, 'effective_chat': type('Chat', (), {'id': 1})()})()
+    
+    asyncio.run(getattr(bot, handler)(update, None))
+    
+    assert message.texts[-1] == expected
@@ -80,29 +80,20 @@ def test_convert_income():
     assert result['description'] == 'Sueldo'
 
 
-def test_convert_boolean_variations():
+@pytest.mark.parametrize("val,expected", [
+    ('True', True), ('true', True), ('1', True), ('yes', True), ('YES', True),
+    ('False', False), ('false', False), ('0', False), ('no', False), ('NO', False), ('', False),
+])
+def test_convert_boolean_variations(val, expected):
     """Test diferentes formatos de booleanos"""
-    # True variations
-    for true_val in ['True', 'true', '1', 'yes', 'YES']:
-        csv_row = {
-            'id': '1',
-            'fecha': '2026-01-31',
-            'monto': '100',
-            'es_ingreso': true_val
-        }
-        result = convert_csv_to_sql_format(csv_row)
-        assert result['is_income'] is True
-    
-    # False variations
-    for false_val in ['False', 'false', '0', 'no', 'NO', '']:
-        csv_row = {
-            'id': '1',
-            'fecha': '2026-01-31',
-            'monto': '100',
-            'es_ingreso': false_val
-        }
-        result = convert_csv_to_sql_format(csv_row)
-        assert result['is_income'] is False
+    csv_row = {
+        'id': '1',
+        'fecha': '2026-01-31',
+        'monto': '100',
+        'es_ingreso': val
+    }
+    result = convert_csv_to_sql_format(csv_row)
+    assert result['is_income'] is expected
 
 
 def test_convert_with_exchange_rate():
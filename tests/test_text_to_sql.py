@@ -2,8 +2,21 @@
 Tests para text_to_sql.py
 """
 import pytest
+import yaml
+from pathlib import Path
 from text_to_sql import is_safe_query
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+
+_COMMON_QUERIES = yaml.load(
+    (Path(__file__).parent / 'fixtures' / 'common_queries.yaml').read_text(encoding='utf-8'),
+    Loader=_YamlLoader
+)
+
 
 def test_safe_select_query():
     """Test query SELECT seguro"""
@@ -27,51 +40,18 @@ def test_safe_select_with_join():
     assert is_safe_query(sql) is True
 
 
-def test_unsafe_delete():
-    """Test que DELETE es rechazado"""
-    sql = "DELETE FROM transactions WHERE id = '123'"
-    assert is_safe_query(sql) is False
-
-
-def test_unsafe_update():
-    """Test que UPDATE es rechazado"""
-    sql = "UPDATE transactions SET amount = 0 WHERE id = '123'"
-    assert is_safe_query(sql) is False
-
-
-def test_unsafe_insert():
-    """Test que INSERT es rechazado"""
-    sql = "INSERT INTO transactions (amount) VALUES (100)"
-    assert is_safe_query(sql) is False
-
-
-def test_unsafe_drop():
-    """Test que DROP es rechazado"""
-    sql = "DROP TABLE transactions"
-    assert is_safe_query(sql) is False
-
-
-def test_unsafe_alter():
-    """Test que ALTER es rechazado"""
-    sql = "ALTER TABLE transactions ADD COLUMN test TEXT"
-    assert is_safe_query(sql) is False
-
-
-def test_unsafe_create():
-    """Test que CREATE es rechazado"""
-    sql = "CREATE TABLE test (id TEXT)"
-    assert is_safe_query(sql) is False
-
-
-def test_unsafe_truncate():
-    """Test que TRUNCATE es rechazado"""
-    sql = "TRUNCATE TABLE transactions"
-    assert is_safe_query(sql) is False
-
-
-def test_unsafe_pragma():
-    """Test que PRAGMA es rechazado"""
-    sql = "PRAGMA table_info(transactions)"
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM transactions WHERE id = '123'",
+    "UPDATE transactions SET amount = 0 WHERE id = '123'",
+    "INSERT INTO transactions (amount) VALUES (100)",
+    "DROP TABLE transactions",
+    "ALTER TABLE transactions ADD COLUMN test TEXT",
+    "CREATE TABLE test (id TEXT)",
+    "TRUNCATE TABLE transactions",
+    "PRAGMA table_info(transactions)",
+], ids=["delete", "update", "insert", "drop", "alter", "create", "truncate", "pragma"])
+def test_unsafe_statements(sql):
+    """Test que DELETE/UPDATE/INSERT/DROP/ALTER/CREATE/TRUNCATE/PRAGMA son rechazados"""
     assert is_safe_query(sql) is False
 
 
@@ -79,9 +59,14 @@ def test_select_with_dangerous_keyword_in_string():
     """Test que keyword en string literal no causa falso positivo"""
     # Este es un edge case: la palabra DELETE aparece en un string
     sql = "SELECT description FROM transactions WHERE description LIKE '%DELETE%'"
-    # Este test debería fallar con la implementación actual (que es conservadora)
-    # En producción, podrías usar un parser SQL real para evitar falsos positivos
-    assert is_safe_query(sql) is False  # Conservador: rechaza
+    # El parser SQL distingue literales de sentencias
+    assert is_safe_query(sql) is True
+
+
+def test_multiple_statements_rejected():
+    """Test que un SELECT seguido de otra sentencia es rechazado"""
+    sql = "SELECT * FROM transactions; DROP TABLE transactions"
+    assert is_safe_query(sql) is False
 
 
 def test_case_insensitive():
@@ -110,46 +95,17 @@ def test_whitespace_handling():
     assert is_safe_query(sql) is True
 
 
-# Tests de ejemplos de queries comunes
-def test_common_query_total_expenses():
-    """Test query común: total expenses"""
-    sql = "SELECT SUM(amount) FROM transactions WHERE is_income = 0"
-    assert is_safe_query(sql) is True
-
-
-def test_common_query_by_category():
-    """Test query común: by category"""
-    sql = """
-    SELECT category, SUM(amount) as total
-    FROM transactions
-    WHERE is_income = 0
-    GROUP BY category
-    ORDER BY total DESC
-    """
-    assert is_safe_query(sql) is True
-
-
-def test_common_query_this_month():
-    """Test query común: this month"""
-    sql = """
-    SELECT SUM(amount)
-    FROM transactions
-    WHERE is_income = 0
-    AND strftime('%Y-%m', date) = strftime('%Y-%m', 'now')
-    """
+def test_keyword_inside_identifier_is_safe():
+    """Test que keywords dentro de un identificador no se rechazan"""
+    sql = "SELECT created_at, last_update FROM transactions"
     assert is_safe_query(sql) is True
 
 
-def test_common_query_balance():
-    """Test query común: balance"""
-    sql = """
-    SELECT 
-        SUM(CASE WHEN is_income = 1 THEN amount ELSE 0 END) as income,
-        SUM(CASE WHEN is_income = 0 THEN amount ELSE 0 END) as expenses,
-        SUM(CASE WHEN is_income = 1 THEN amount ELSE -amount END) as balance
-    FROM transactions
-    """
-    assert is_safe_query(sql) is True
+# Tests de ejemplos de queries comunes (tests/fixtures/common_queries.yaml)
+@pytest.mark.parametrize("case", _COMMON_QUERIES, ids=lambda case: case['name'])
+def test_common_query(case):
+    """Test query común"""
+    assert is_safe_query(case['sql']) is case['safe']
 
 
 if __name__ == '__main__':
@@ -2,7 +2,8 @@
 Tests para yaml_to_modal.py
 """
 import pytest
-from yaml_to_modal import convert_yaml_to_json
+import yaml_to_modal
+from yaml_to_modal import convert_yaml_to_json, ingest_batch
 
 
 def test_minimal_yaml():
@@ -140,5 +141,64 @@ descripcion: Test
     assert 'is_income' in result  # default
 
 
+def test_ingest_batch_invalid_docs_fail_individually():
+    """Test que los documentos que no convierten fallan sin llegar a la API"""
+    results = ingest_batch(["descripcion: Sin monto", ""], api_url="http://unused", api_key="k")
+    
+    assert [r['index'] for r in results] == [1, 2]
+    assert all(not r['success'] for r in results)
+    assert "monto" in results[0]['error']
+    assert "vacío" in results[1]['error']
+
+
+def _fake_batch(monkeypatch, ids_for):
+    """Reemplazar send_batch_to_modal; ids_for(items) arma la lista de IDs de la respuesta"""
+    sent = []
+    
+    def send_batch(json_items, api_url=None, api_key=None):
+        sent.extend(json_items)
+        return {'success': True, 'ids': ids_for(json_items), 'message': 'ok'}
+    
+    monkeypatch.setattr(yaml_to_modal, 'send_batch_to_modal', send_batch)
+    return sent
+
+
+def test_ingest_batch_maps_ids_to_docs(monkeypatch):
+    """Test que cada ID vuelve al documento que lo generó, salteando los inválidos"""
+    sent = _fake_batch(monkeypatch, lambda items: [f"id-{item['amount']:g}" for item in items])
+    
+    results = ingest_batch(["monto: 10", "descripcion: Sin monto", "monto: 20\ndescripcion: Cena"])
+    
+    assert len(sent) == 2
+    assert [r['success'] for r in results] == [True, False, True]
+    assert results[0]['result'] == {'id': 'id-10'}
+    assert results[2]['result'] == {'id': 'id-20'}
+    assert results[2]['data'] == {'amount': 20.0, 'description': 'Cena', 'currency': 'ARS', 'is_income': False}
+
+
+def test_ingest_batch_ids_mismatch_fails_batch(monkeypatch):
+    """Test que si la API devuelve menos IDs que transacciones ningún documento queda sin resultado"""
+    _fake_batch(monkeypatch, lambda items: ['id-1'])
+    
+    results = ingest_batch(["monto: 10", "monto: 20"])
+    
+    assert [r['success'] for r in results] == [False, False]
+    assert "1 IDs para 2" in results[1]['error']
+
+
+def test_ingest_batch_api_error_fails_whole_batch(monkeypatch):
+    """Test que si la API rechaza el batch fallan todos los docs enviados (el endpoint es todo o nada)"""
+    def send_batch(json_items, api_url=None, api_key=None):
+        raise RuntimeError("Error al enviar a Modal API: 500 Server Error")
+    
+    monkeypatch.setattr(yaml_to_modal, 'send_batch_to_modal', send_batch)
+    
+    results = ingest_batch(["monto: 1", "descripcion: Sin monto", "monto: 2"])
+    
+    assert [r['success'] for r in results] == [False, False, False]
+    assert "500" in results[0]['error'] and "500" in results[2]['error']
+    assert "monto" in results[1]['error']
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])